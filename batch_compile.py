@@ -0,0 +1,162 @@
+# 批量预编译谱面：对一个目录下的所有 .aff 进行解析、6k分段和求解，把可直接播放的触控序列写到磁盘
+# 用法: python batch_compile.py <谱面目录> [--config auto_arcaea_config.json] [--out compiled] [--jobs N] [--force]
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chart import ParseOptions
+from chart_cache import content_hash
+from pointers import DEFAULT_MAX_POINTERS
+from solve import DEFAULT_MAX_PIXEL_ERROR
+from timeline_cache import CALIBRATION_KEYS, load_or_solve, timeline_key
+
+CONFIG_FILE = "auto_arcaea_config.json"
+MANIFEST_FILE = "manifest.json"
+
+
+def load_profile(config_path: str) -> dict:
+    """从配置文件中取出求解需要的校准坐标、采样误差上限、指针数上限和 designant 选择"""
+    with open(config_path, "r") as f:
+        config_params = json.load(f)["global"]
+    profile = {key: list(config_params[key]) for key in CALIBRATION_KEYS}
+    profile["max_pixel_error"] = config_params.get("max_pixel_error", DEFAULT_MAX_PIXEL_ERROR)
+    profile["max_pointers"] = config_params.get("max_pointers", DEFAULT_MAX_POINTERS)
+    profile["designant_choice"] = config_params.get("designant_choice")
+    return profile
+
+
+def parse_options_of(profile: dict) -> ParseOptions:
+    return ParseOptions(designant=profile["designant_choice"] is not False)
+
+
+def output_key(data_hash: str, profile: dict) -> str:
+    """输出是否过期由求解结果缓存的键、校准坐标和指针数上限共同决定"""
+    calibration = [profile[key] for key in CALIBRATION_KEYS]
+    signature = json.dumps([
+        timeline_key(data_hash, parse_options_of(profile), profile["max_pixel_error"], calibration),
+        calibration,
+        profile["max_pointers"],
+    ])
+    return hashlib.blake2b(signature.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def compile_chart(chart_path: str, out_path: str, profile: dict) -> dict:
+    start = time.perf_counter()
+    parse_options = parse_options_of(profile)
+    solved = load_or_solve(
+        chart_path,
+        [profile[key] for key in CALIBRATION_KEYS],
+        profile["max_pixel_error"],
+        lambda has_designant: parse_options,
+        workers=1,  # 已经按谱面并行，谱面内部不再开进程池
+        max_pointers=profile["max_pointers"],
+    )
+    loaded = time.perf_counter()
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'delay': solved.delay,
+            'events': {
+                ms: [[*ev.pos, ev.action.value, ev.pointer] for ev in evs]
+                for ms, evs in solved.timeline
+            },
+        }, f)
+    os.replace(tmp_path, out_path)
+
+    return {
+        'key': output_key(solved.content_hash, profile),
+        'cached': solved.cached,
+        'solve_ms': (loaded - start) * 1000,
+        'write_ms': (time.perf_counter() - loaded) * 1000,
+        'raw_events': solved.raw_events,
+        'events': len(solved.timeline),
+        'arc_moves': solved.stats.get('arc_moves', 0),
+        'fixed_arc_moves': solved.stats.get('fixed_arc_moves', 0),
+        'peak_pointers': solved.pointers.peak,
+        'dropped_touches': len(solved.pointers.dropped),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Precompile every .aff chart in a directory into touch timelines")
+    parser.add_argument("chart_dir", help="directory searched recursively for .aff files")
+    parser.add_argument("--config", default=CONFIG_FILE, help="calibration profile, same format as auto_arcaea_config.json")
+    parser.add_argument("--out", default="compiled", help="output directory")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="recompile charts that are already up to date")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.config)
+    manifest_path = os.path.join(args.out, MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
+
+    jobs = []
+    for root, _, files in os.walk(args.chart_dir):
+        for name in sorted(files):
+            if not name.lower().endswith('.aff'):
+                continue
+            chart_path = os.path.join(root, name)
+            rel_path = os.path.relpath(chart_path, args.chart_dir)
+            out_path = os.path.join(args.out, rel_path + '.json')
+            with open(chart_path, 'rb') as f:
+                key = output_key(content_hash(f.read()), profile)
+            if not args.force and manifest.get(rel_path) == key and os.path.exists(out_path):
+                print(f"[skip] {rel_path}: up to date")
+                continue
+            jobs.append((rel_path, chart_path, out_path))
+
+    if not jobs:
+        print("Nothing to compile")
+        return 0
+
+    failed = 0
+    total_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(compile_chart, chart_path, out_path, profile): rel_path
+            for rel_path, chart_path, out_path in jobs
+        }
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[fail] {rel_path}: {e}")
+                continue
+            manifest[rel_path] = stats['key']
+            arc_moves = (
+                f"arc moves {stats['fixed_arc_moves']} fixed -> {stats['arc_moves']} adaptive, "
+                if profile["max_pixel_error"] is not None
+                else ""
+            )
+            print(
+                f"[done] {rel_path}: {'cached' if stats['cached'] else 'parse + solve'} {stats['solve_ms']:.1f} ms, "
+                f"write {stats['write_ms']:.1f} ms, {stats['raw_events']} -> {stats['events']} events after coalescing, "
+                f"{arc_moves}peak {stats['peak_pointers']} pointers"
+            )
+            if stats['dropped_touches']:
+                print(
+                    f"[warn] {rel_path}: needs {stats['peak_pointers']} simultaneous pointers (limit {profile['max_pointers']}), "
+                    f"dropped {stats['dropped_touches']} touches"
+                )
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Compiled {len(jobs) - failed}/{len(jobs)} charts in {time.perf_counter() - total_start:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# 谱面解析性能测试：对比旧版 eval 解析与当前 Chart.loads 的每秒解析行数
+# 用法: python bench_parse.py [谱面.aff ...]
+# 不传参数时使用随机生成的谱面
+import io
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from chart import Chart, Arc, ArcTap, Tap, Hold, Timing, TimingGroup
+from easing import Easing
+
+
+def legacy_loads(content: str) -> Chart:
+    """旧版 Chart.loads 的逐行 re.sub + eval 实现，仅用作性能对照"""
+    lines = content.splitlines()
+    options = {}
+    notes = []
+    line_iter = iter(lines)
+    lcls = {
+        'true': True,
+        'false': False,
+        'none': None,
+        'arc': Arc,
+        'tap': Tap,
+        'arctap': ArcTap,
+        'hold': Hold,
+        'timing': Timing,
+        'timinggroup': TimingGroup,
+        's': Easing.Linear,
+        'b': Easing.CubicBezier,
+        'so': Easing.So,
+        'si': Easing.Si,
+        'soso': Easing.SoSo,
+        'sisi': Easing.SiSi,
+        'sosi': Easing.SoSi,
+        'siso': Easing.SiSo,
+    }
+
+    for line in line_iter:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            options[key.strip()] = value.strip()
+        else:
+            break
+
+    stack = []
+    current_notes = notes
+
+    for line in line_iter:
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        if line.startswith('timinggroup'):
+            stack.append(current_notes)
+            group = TimingGroup({}, [])
+            current_notes.append(group)
+            current_notes = group.notes
+        elif line.startswith('};'):
+            if stack:
+                current_notes = stack.pop()
+        else:
+            if line.endswith(';'):
+                line = line[:-1]
+            line = re.sub(r'(?<=[\(, ])(\b(?!true|false|none|\d+\.?\d*|s|b|so|si|soso|sisi)\w+\b)(?=[,\) ])', r'"\1"', line)
+            try:
+                note = eval(line, {}, lcls)
+                if isinstance(note, tuple):
+                    note = Tap(*note)
+                current_notes.append(note)
+            except Exception:
+                pass
+
+    return Chart(notes, options)
+
+
+def random_chart(note_count: int = 20000) -> str:
+    rnd = random.Random(0)
+    easings = ['s', 'b', 'si', 'so', 'sisi', 'soso', 'sosi', 'siso']
+    lines = ['AudioOffset:0', '-', 'timing(0,120.00,4.00);']
+    tick = 0
+    for _ in range(note_count):
+        tick += rnd.randint(20, 200)
+        kind = rnd.random()
+        if kind < 0.35:
+            lines.append(f'({tick},{rnd.randint(1, 4)});')
+        elif kind < 0.5:
+            lines.append(f'hold({tick},{tick + rnd.randint(100, 800)},{rnd.randint(1, 4)});')
+        else:
+            end = tick + rnd.randint(50, 1500)
+            trace = rnd.random() < 0.3
+            taps = f'[arctap({tick}),arctap({end})]' if trace else ''
+            lines.append(
+                f'arc({tick},{end},{rnd.uniform(-0.5, 1.5):.2f},{rnd.uniform(-0.5, 1.5):.2f},{rnd.choice(easings)},'
+                f'{rnd.uniform(0, 1):.2f},{rnd.uniform(0, 1):.2f},{rnd.randint(0, 1)},none,{str(trace).lower()}){taps};'
+            )
+    return '\n'.join(lines)
+
+
+def bench(name: str, loads, content: str, repeat: int = 3) -> float:
+    line_count = content.count('\n') + 1
+    best = min(_timed(loads, content) for _ in range(repeat))
+    print(f'{name:>8}: {best * 1000:9.2f} ms  {line_count / best:12.0f} lines/s')
+    return best
+
+
+def _timed(loads, content: str) -> float:
+    start = time.perf_counter()
+    loads(content)
+    return time.perf_counter() - start
+
+
+def bench_stream(open_source) -> None:
+    """对比一次性 Chart.load 与逐个消费 Chart.iter_notes 的首个note耗时和峰值内存"""
+    for name, consume in (('load', _consume_load), ('stream', _consume_stream)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open_source() as source:
+            first = consume(source)
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{name:>8}: first note {(first - start) * 1000:8.2f} ms, total {total * 1000:8.2f} ms, peak {peak / 1024:9.0f} KiB')
+
+
+def _consume_load(source) -> float:
+    content = source.read()
+    chart = Chart.loads(content)
+    first = time.perf_counter()
+    for _ in chart.notes:
+        pass
+    return first
+
+
+def _consume_stream(source) -> float:
+    first = None
+    for _ in Chart.iter_notes(source):
+        if first is None:
+            first = time.perf_counter()
+    return first
+
+
+if __name__ == '__main__':
+    sources = [(path, open(path, 'r', encoding='utf-8').read()) for path in sys.argv[1:]]
+    if not sources:
+        sources = [('<random 20000 notes>', random_chart())]
+    for path, content in sources:
+        print(path)
+        old = bench('legacy', legacy_loads, content)
+        new = bench('current', Chart.loads, content)
+        print(f'{"speedup":>8}: {old / new:.2f}x')
+        if path in sys.argv[1:]:
+            bench_stream(lambda: open(path, 'r', encoding='utf-8'))
+        else:
+            bench_stream(lambda: io.StringIO(content))
@@ -1,11 +1,13 @@
-from typing import Any, Union, List, Optional
-import json
+from typing import Any, IO, Iterator, NamedTuple, Union, List, Optional
+import io
+import mmap
+import re
 
 from easing import Easing
-CONFIG_FILE = "auto_arcaea_config.json"
 
 
 class ArcTap:
+    __slots__ = ('tick',)
     tick: int
 
     def __init__(self, tick: int):
@@ -16,6 +18,7 @@ class ArcTap:
 
 
 class Arc:  # 虹弧Arc & 天空Note
+    __slots__ = ('start', 'end', 'start_x', 'end_x', 'easing', 'start_y', 'end_y', 'color', 'trace_arc', 'designant', 'taps')
     start: int
     end: int
     start_x: float
@@ -25,6 +28,7 @@ class Arc:  # 虹弧Arc & 天空Note
     end_y: float
     color: int
     trace_arc: bool
+    designant: bool
     taps: list[ArcTap]
 
     def __init__(
@@ -49,37 +53,9 @@ class Arc:  # 虹弧Arc & 天空Note
         self.end_y = end_y
         self.color = color
         
-        # 处理 "designant" 
-        if trace_arc == "designant":
-            try:
-                with open(CONFIG_FILE, "r") as f:
-                    config = json.load(f)
-            except:
-                config = {"global": {"designant_choice": None}}
-            
-            designant_choice = config["global"].get("designant_choice")
-            
-            if designant_choice is None:
-                print("\n检测到谱面包含蚂蚁异象（designant）特有的note")
-                user_input = input("您是否在游玩蚂蚁异象？(y/n): ").strip().lower()
-                designant_choice = (user_input == 'y')
-                
-                # 保存到配置文件
-                config["global"]["designant_choice"] = designant_choice
-                with open(CONFIG_FILE, "w") as f:
-                    json.dump(config, f, indent=2)
-                
-                if designant_choice:
-                    print("已启用 designant 异象模式")
-                else:
-                    print("已禁用 designant 异象模式，将忽略所有特殊note")
-            
-            if not designant_choice:
-                raise ValueError("IGNORE_DESIGNANT_LINE")
-            
-            self.trace_arc = True
-        else:
-            self.trace_arc = bool(trace_arc)
+        # 蚂蚁异象(designant)特有的arc按天空note处理，是否保留由解析时的 ParseOptions 决定
+        self.designant = trace_arc == "designant"
+        self.trace_arc = True if self.designant else bool(trace_arc)
         
         self.taps = []
 
@@ -95,6 +71,7 @@ class Arc:  # 虹弧Arc & 天空Note
 
 
 class Tap:  # 地键Tap
+    __slots__ = ('tick', 'track')
     tick: int
     track: int
 
@@ -107,6 +84,7 @@ class Tap:  # 地键Tap
 
 
 class Hold:  # 地面Hold
+    __slots__ = ('start', 'end', 'track')
     start: int
     end: int
     track: int
@@ -121,6 +99,7 @@ class Hold:  # 地面Hold
 
 
 class Timing:
+    __slots__ = ('tick', 'bpm', 'beats_per_measure')
     tick: int
     bpm: float
     beats_per_measure: float
@@ -146,134 +125,293 @@ class TimingGroup:
         return f'timinggroup({self.properties}, notes={self.notes})'
 
 
+class SceneControl:
+    tick: int
+    type: str
+    args: list[Any]
+
+    def __init__(self, tick: int, type: str, *args: Any):
+        self.tick = tick
+        self.type = type
+        self.args = list(args)
+
+    def __str__(self):
+        return f'scenecontrol(tick={self.tick}, type={self.type}, args={self.args})'
+
+
+class ParseOptions(NamedTuple):
+    """解析谱面时的选项，需要在解析开始前确定，解析过程中不会再读配置文件或询问用户"""
+    designant: bool = True  # 是否保留蚂蚁异象(designant)特有的arc，为False时解析时直接丢弃
+
+
+# 谱面解析器的版本号，解析结果的格式或语义发生变化时递增
+PARSER_VERSION = 1
+
+_EASINGS = {
+    's': Easing.Linear,
+    'b': Easing.CubicBezier,
+    'so': Easing.So,
+    'si': Easing.Si,
+    'soso': Easing.SoSo,
+    'sisi': Easing.SiSi,
+    'sosi': Easing.SoSi,
+    'siso': Easing.SiSo,
+}
+_TRACE_VALUES = {'true': True, 'false': False, 'none': False, 'designant': 'designant'}
+_LITERALS = {'true': True, 'false': False, 'none': None}
+
+# name(args)[arctap(...),...];  地键Tap没有name，形如 (tick,track);
+_NOTE_RE = re.compile(r'([a-z]*)\(([^()]*)\)\s*(?:\[(.*)\])?\s*;?')
+_ARCTAP_RE = re.compile(r'arctap\(\s*([-\d.]+)\s*\)')
+
+
+def _int(token: str) -> int:
+    try:
+        return int(token)
+    except ValueError:
+        return int(float(token))
+
+
+def _literal(token: str) -> Any:
+    token = token.strip()
+    if token in _LITERALS:
+        return _LITERALS[token]
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+def _parse_tap(args: list[str], taps: str | None, options: ParseOptions) -> Tap:
+    tick, track = args
+    return Tap(_int(tick), _literal(track))
+
+
+def _parse_hold(args: list[str], taps: str | None, options: ParseOptions) -> Hold:
+    start, end, track = args
+    return Hold(_int(start), _int(end), _literal(track))
+
+
+def _parse_arc(args: list[str], taps: str | None, options: ParseOptions) -> Arc | None:
+    start, end, start_x, end_x, easing, start_y, end_y, color, fx, trace_arc = args
+    easing = easing.strip()
+    trace_arc = trace_arc.strip()
+    if easing not in _EASINGS:
+        raise ValueError(f'unknown easing {easing!r}')
+    if trace_arc not in _TRACE_VALUES:
+        raise ValueError(f'unknown trace flag {trace_arc!r}')
+    if trace_arc == 'designant' and not options.designant:
+        return None
+    arc = Arc(
+        _int(start),
+        _int(end),
+        float(start_x),
+        float(end_x),
+        _EASINGS[easing],
+        float(start_y),
+        float(end_y),
+        _int(color),
+        fx.strip(),
+        _TRACE_VALUES[trace_arc],
+    )
+    if taps:
+        arc.taps = [ArcTap(_int(tick)) for tick in _ARCTAP_RE.findall(taps)]
+    return arc
+
+
+def _parse_timing(args: list[str], taps: str | None, options: ParseOptions) -> Timing:
+    tick, bpm, beats_per_measure = args
+    return Timing(_int(tick), float(bpm), float(beats_per_measure))
+
+
+def _parse_scenecontrol(args: list[str], taps: str | None, options: ParseOptions) -> SceneControl:
+    tick, type_, *rest = args
+    return SceneControl(_int(tick), type_.strip(), *map(_literal, rest))
+
+
+# name -> (解析函数, 参数个数)，参数个数为None时不做检查
+_NOTE_PARSERS = {
+    '': (_parse_tap, 2),
+    'hold': (_parse_hold, 3),
+    'arc': (_parse_arc, 10),
+    'timing': (_parse_timing, 3),
+    'scenecontrol': (_parse_scenecontrol, None),
+}
+
+
+def _parse_note_line(line: str, options: ParseOptions) -> Union[Timing, Tap, Hold, Arc, SceneControl, None]:
+    match = _NOTE_RE.fullmatch(line)
+    if match is None:
+        raise ValueError('malformed note')
+    name, args, taps = match.groups()
+    if name not in _NOTE_PARSERS:
+        raise ValueError(f'unknown note type {name!r}')
+    parser, arity = _NOTE_PARSERS[name]
+    args = args.split(',')
+    if arity is not None and len(args) != arity:
+        raise ValueError(f'{name or "tap"} takes {arity} arguments but {len(args)} were given')
+    return parser(args, taps, options)
+
+
+def _iter_lines(source: Union[IO, mmap.mmap]) -> Iterator[str]:
+    lines = iter(source.readline, b'') if isinstance(source, mmap.mmap) else source
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line
+
+
+def _parse_timinggroup_properties(properties_str: str) -> dict[str, Any]:
+    properties = {}
+    for item in properties_str.split('_'):
+        item = item.strip()
+        if not item:
+            continue
+        if item.startswith('anglex'):
+            try:
+                angle_value = int(item[5:])
+                properties['anglex'] = angle_value
+            except ValueError:
+                properties[item] = True
+        elif item.startswith('angley'):
+            try:
+                angle_value = int(item[5:])
+                properties['angley'] = angle_value
+            except ValueError:
+                properties[item] = True
+        else:
+            properties[item] = True
+    for item in properties_str.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            key, value = item.split('=', 1)
+            key = key.strip()
+            value = value.strip()
+
+            if value.lower() == 'true':
+                properties[key] = True
+            elif value.lower() == 'false':
+                properties[key] = False
+            elif value.lower() == 'none':
+                properties[key] = None
+            elif value.isdigit():
+                properties[key] = int(value)
+            elif '.' in value and all(part.isdigit() for part in value.split('.')):
+                properties[key] = float(value)
+            else:
+                properties[key] = value
+        else:
+            properties['type'] = item
+    return properties
+
+
 class Chart:
     notes: List[Union[Timing, Tap, Hold, Arc, TimingGroup]]
     options: dict[str, Any] | None
+    scenecontrols: List[SceneControl]
 
-    def __init__(self, notes: List[Union[Timing, Tap, Hold, Arc, TimingGroup]], options: dict[str, Any] | None = None):
+    def __init__(
+        self,
+        notes: List[Union[Timing, Tap, Hold, Arc, TimingGroup]],
+        options: dict[str, Any] | None = None,
+        scenecontrols: List[SceneControl] | None = None,
+    ):
         self.notes = notes
         self.options = options
+        self.scenecontrols = scenecontrols if scenecontrols is not None else []
+        self._time_index = None
+
+    @property
+    def time_index(self) -> 'NoteIndex':
+        """按时间排序的 note 索引，首次访问时建立"""
+        if self._time_index is None:
+            from note_index import NoteIndex
+            self._time_index = NoteIndex(self)
+        return self._time_index
+
+    def to_arrays(self) -> 'ChartArrays':
+        from chart_arrays import ChartArrays
+        return ChartArrays.from_chart(self)
+
+    @classmethod
+    def loads(cls, content: str, parse_options: ParseOptions | None = None) -> 'Chart':
+        return cls.load(io.StringIO(content), parse_options)
 
     @classmethod
-    def loads(cls, content: str) -> 'Chart':
-        lines = content.splitlines()
+    def load(cls, source: Union[IO, mmap.mmap], parse_options: ParseOptions | None = None) -> 'Chart':
         options = {}
         notes = []
-        line_iter = iter(lines)
-        lcls = {
-            'true': True,
-            'false': False,
-            'none': None,
-            'arc': Arc,
-            'tap': Tap,
-            'arctap': ArcTap,
-            'hold': Hold,
-            'timing': Timing,
-            'timinggroup': TimingGroup,
-            's': Easing.Linear,
-            'b': Easing.CubicBezier,
-            'so': Easing.So,
-            'si': Easing.Si,
-            'soso': Easing.SoSo,
-            'sisi': Easing.SiSi,
-            'sosi': Easing.SoSi,
-            'siso': Easing.SiSo,
-        }
-
-        for line in line_iter:
+        scenecontrols = []
+        for note in cls.iter_notes(source, options, parse_options):
+            if isinstance(note, SceneControl):
+                scenecontrols.append(note)
+            else:
+                notes.append(note)
+        return Chart(notes, options, scenecontrols)
+
+    @staticmethod
+    def iter_notes(
+        source: Union[IO, mmap.mmap], options: dict[str, Any] | None = None, parse_options: ParseOptions | None = None
+    ) -> Iterator[Union[Timing, Tap, Hold, Arc, TimingGroup, SceneControl]]:
+        """逐个产出谱面中的顶层元素，不需要把整个文件读进内存
+        TimingGroup 在其结束行 }; 之后才会整体产出，SceneControl 无论位于哪一层都会直接产出。
+        :param source: 文本或二进制文件对象，也可以是 mmap
+        :param options: 若提供，谱面头部的 key:value 会写入这个字典
+        :param parse_options: 解析选项，默认为 ParseOptions()
+        """
+        if options is None:
+            options = {}
+        if parse_options is None:
+            parse_options = ParseOptions()
+        line_iter = enumerate(_iter_lines(source), 1)
+
+        for _, line in line_iter:
             if ':' in line:
                 key, value = line.split(':', 1)
                 options[key.strip()] = value.strip()
             else:
                 break
 
-        stack = []
-        current_notes = notes
-        current_properties = None
+        stack: list[TimingGroup] = []
 
-        for line in line_iter:
+        for lineno, line in line_iter:
             line = line.strip()
             if not line or line.startswith('//'):
-                continue  
+                continue
 
             if line.startswith('timinggroup'):
                 attr_start = line.find('(')
                 attr_end = line.rfind(')')
                 if attr_start == -1 or attr_end == -1:
                     continue
-                properties_str = line[attr_start + 1:attr_end]
-                
-                properties = {}
-                for item in properties_str.split('_'):
-                    item = item.strip()
-                    if not item:
-                        continue
-                    if item.startswith('anglex'):
-                        try:
-                            angle_value = int(item[5:])
-                            properties['anglex'] = angle_value
-                        except ValueError:
-                            properties[item] = True
-                    elif item.startswith('angley'):
-                        try:
-                            angle_value = int(item[5:])
-                            properties['angley'] = angle_value
-                        except ValueError:
-                            properties[item] = True
-                    else:
-                        properties[item] = True
-                for item in properties_str.split(','):
-                    item = item.strip()
-                    if not item:
-                        continue
-                    if '=' in item:
-                        key, value = item.split('=', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        
-                        if value.lower() == 'true':
-                            properties[key] = True
-                        elif value.lower() == 'false':
-                            properties[key] = False
-                        elif value.lower() == 'none':
-                            properties[key] = None
-                        elif value.isdigit():
-                            properties[key] = int(value)
-                        elif '.' in value and all(part.isdigit() for part in value.split('.')):
-                            properties[key] = float(value)
-                        else:
-                            properties[key] = value
-                    else:
-                        properties['type'] = item
-                
-                stack.append((current_notes, current_properties))
-                group = TimingGroup(properties, [])
-                current_notes.append(group)
-                current_notes = group.notes
-                current_properties = properties
-                
-                if '{' in line[attr_end + 1:]:
-                    continue 
-            elif line.startswith('};'):
+                group = TimingGroup(_parse_timinggroup_properties(line[attr_start + 1:attr_end]), [])
                 if stack:
-                    current_notes, current_properties = stack.pop()
+                    stack[-1].notes.append(group)
+                stack.append(group)
+            elif line.startswith('}'):
+                if stack:
+                    group = stack.pop()
+                    if not stack:
+                        yield group
             else:
-                if line.endswith(';'):
-                    line = line[:-1] 
-                import re
-                line = re.sub(r'(?<=[\(, ])(\b(?!true|false|none|\d+\.?\d*|s|b|so|si|soso|sisi)\w+\b)(?=[,\) ])', r'"\1"', line)
                 try:
-                    note = eval(line, {}, lcls)
-                    if isinstance(note, tuple):
-                        note = Tap(*note)
-                    current_notes.append(note)
+                    note = _parse_note_line(line, parse_options)
                 except ValueError as e:
-                    # 处理用户选择忽略 designate 行的情况
-                    if str(e) == "IGNORE_DESIGNANT_LINE":
-                        continue
-                    else:
-                        print(f"Error parsing line: {line}\n{str(e)}")
-                except Exception as e:
-                    print(f"Error parsing line: {line}\n{str(e)}")
-
-        return Chart(notes, options)
\ No newline at end of file
+                    print(f"Error parsing line {lineno}: {line}\n{str(e)}")
+                    continue
+                if note is None:
+                    continue
+                if stack and not isinstance(note, SceneControl):
+                    stack[-1].notes.append(note)
+                else:
+                    yield note
+
+        # 文件末尾缺少 }; 的 timinggroup 也照常产出
+        if stack:
+            yield stack[0]
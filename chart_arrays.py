@@ -0,0 +1,154 @@
+# 谱面的列式(NumPy结构化数组)表示
+# 每种note一个结构化数组，timinggroup嵌套被展开为 group 列，arctap 按 arc 的偏移索引存放
+from typing import Any
+import sys
+
+import numpy as np
+
+from chart import Chart, Arc, Tap, Hold, Timing, TimingGroup
+from easing import Easing
+
+NO_GROUP = -1  # 不属于任何 timinggroup 的 note 的 group 值
+
+EASINGS = list(Easing)
+EASING_CODES = {easing: code for code, easing in enumerate(EASINGS)}
+
+TAP_DTYPE = np.dtype([('tick', 'i4'), ('track', 'f4'), ('group', 'i4')])
+HOLD_DTYPE = np.dtype([('start', 'i4'), ('end', 'i4'), ('track', 'f4'), ('group', 'i4')])
+ARC_DTYPE = np.dtype([
+    ('start', 'i4'),
+    ('end', 'i4'),
+    ('start_x', 'f8'),
+    ('end_x', 'f8'),
+    ('start_y', 'f8'),
+    ('end_y', 'f8'),
+    ('easing', 'u1'),
+    ('color', 'i1'),
+    ('trace', '?'),
+    ('designant', '?'),
+    ('group', 'i4'),
+    ('tap_start', 'i4'),  # 该 arc 的 arctap 在 arctaps 中的起始下标
+    ('tap_count', 'i4'),
+])
+ARCTAP_DTYPE = np.dtype([('tick', 'i4'), ('arc', 'i4')])
+TIMING_DTYPE = np.dtype([('tick', 'i4'), ('bpm', 'f8'), ('beats_per_measure', 'f8'), ('group', 'i4')])
+
+
+class ChartArrays:
+    taps: np.ndarray
+    holds: np.ndarray
+    arcs: np.ndarray
+    arctaps: np.ndarray
+    timings: np.ndarray
+    groups: list[dict[str, Any]]  # 下标即 group 列的值
+    group_parents: np.ndarray  # 每个 timinggroup 的父 group，顶层为 NO_GROUP
+
+    def __init__(
+        self,
+        taps: np.ndarray,
+        holds: np.ndarray,
+        arcs: np.ndarray,
+        arctaps: np.ndarray,
+        timings: np.ndarray,
+        groups: list[dict[str, Any]],
+        group_parents: np.ndarray,
+    ):
+        self.taps = taps
+        self.holds = holds
+        self.arcs = arcs
+        self.arctaps = arctaps
+        self.timings = timings
+        self.groups = groups
+        self.group_parents = group_parents
+
+    @classmethod
+    def from_chart(cls, chart: Chart) -> 'ChartArrays':
+        taps, holds, arcs, arctaps, timings = [], [], [], [], []
+        groups, group_parents = [], []
+
+        def collect(notes, group):
+            for note in notes:
+                if isinstance(note, TimingGroup):
+                    groups.append(note.properties)
+                    group_parents.append(group)
+                    collect(note.notes, len(groups) - 1)
+                elif isinstance(note, Tap):
+                    taps.append((note.tick, note.track, group))
+                elif isinstance(note, Hold):
+                    holds.append((note.start, note.end, note.track, group))
+                elif isinstance(note, Arc):
+                    arcs.append((
+                        note.start, note.end, note.start_x, note.end_x, note.start_y, note.end_y,
+                        EASING_CODES[note.easing], note.color, note.trace_arc, note.designant,
+                        group, len(arctaps), len(note.taps),
+                    ))
+                    arctaps.extend((tap.tick, len(arcs) - 1) for tap in note.taps)
+                elif isinstance(note, Timing):
+                    timings.append((note.tick, note.bpm, note.beats_per_measure, group))
+
+        collect(chart.notes, NO_GROUP)
+        return cls(
+            np.array(taps, dtype=TAP_DTYPE),
+            np.array(holds, dtype=HOLD_DTYPE),
+            np.array(arcs, dtype=ARC_DTYPE),
+            np.array(arctaps, dtype=ARCTAP_DTYPE),
+            np.array(timings, dtype=TIMING_DTYPE),
+            groups,
+            np.array(group_parents, dtype='i4'),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.taps, self.holds, self.arcs, self.arctaps, self.timings, self.group_parents))
+
+    def __len__(self) -> int:
+        return len(self.taps) + len(self.holds) + len(self.arcs) + len(self.arctaps)
+
+    def select(self, t0: int, t1: int) -> 'ChartArrays':
+        """选出时间上与 [t0, t1] 有重叠的 note，arctap 随所属的 arc 一起保留"""
+        taps = self.taps[(self.taps['tick'] >= t0) & (self.taps['tick'] <= t1)]
+        holds = self.holds[(self.holds['start'] <= t1) & (self.holds['end'] >= t0)]
+        arc_mask = (self.arcs['start'] <= t1) & (self.arcs['end'] >= t0)
+        arcs = self.arcs[arc_mask]
+        # 被保留的 arc 的新下标
+        new_index = np.cumsum(arc_mask, dtype='i4') - 1
+        arctaps = self.arctaps[arc_mask[self.arctaps['arc']]]
+        arctaps['arc'] = new_index[arctaps['arc']]
+        arcs['tap_start'] = np.cumsum(arcs['tap_count']) - arcs['tap_count']
+        timings = self.timings[(self.timings['tick'] >= t0) & (self.timings['tick'] <= t1)]
+        return ChartArrays(taps, holds, arcs, arctaps, timings, self.groups, self.group_parents)
+
+    def taps_of(self, arc_index: int) -> np.ndarray:
+        arc = self.arcs[arc_index]
+        return self.arctaps[arc['tap_start']:arc['tap_start'] + arc['tap_count']]
+
+    def max_time(self) -> int:
+        """所有 note 中最晚的结束时间"""
+        ends = [self.taps['tick'], self.holds['end'], self.arcs['end'], self.arctaps['tick']]
+        return int(max((a.max() for a in ends if len(a)), default=0))
+
+    def earliest_tick(self) -> int | None:
+        """最早需要触控的时间：tap、hold、非黑线 arc 的起点和 arctap，没有任何 note 时返回 None"""
+        starts = [
+            self.taps['tick'],
+            self.holds['start'],
+            self.arcs['start'][~self.arcs['trace']],
+            self.arctaps['tick'],
+        ]
+        return min((int(a.min()) for a in starts if len(a)), default=None)
+
+
+if __name__ == '__main__':
+    import tracemalloc
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        content = f.read()
+    tracemalloc.start()
+    chart = Chart.loads(content)
+    object_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrays = chart.to_arrays()
+    print(f'notes: {len(arrays)}')
+    print(f'objects: {object_bytes / len(arrays):8.1f} bytes/note')
+    print(f'arrays:  {arrays.nbytes / len(arrays):8.1f} bytes/note')
+    print(f'max_time: {arrays.max_time()}, earliest: {arrays.earliest_tick()}')
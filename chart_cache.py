@@ -0,0 +1,234 @@
+# 谱面解析结果的二进制缓存
+# 以谱面文件内容的哈希和解析器版本作为键，命中时直接从缓存文件还原 Chart，不再重新解析
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Any, Callable, NamedTuple
+
+from chart import Chart, Arc, ArcTap, Tap, Hold, Timing, TimingGroup, SceneControl, ParseOptions, PARSER_VERSION
+from easing import Easing
+
+CACHE_DIR = ".chart_cache"
+
+_MAGIC = b'AFFC'
+_FORMAT_VERSION = 2
+# magic, 格式版本, 解析器版本, meta(json)长度, 记录条数
+_HEADER = struct.Struct('<4sHHII')
+# kind, easing, trace, _, start, end, color, _, x1, x2, y1, y2
+_RECORD = struct.Struct('<BBBxiiiidddd')
+
+_KIND_TIMING = 0
+_KIND_TAP = 1
+_KIND_HOLD = 2
+_KIND_ARC = 3
+_KIND_ARCTAP = 4
+_KIND_GROUP_BEGIN = 5
+_KIND_GROUP_END = 6
+
+_TRACE_FALSE = 0
+_TRACE_TRUE = 1
+_TRACE_DESIGNANT = 2
+
+_EASING_CODES = {easing: code for code, easing in enumerate(Easing)}
+_EASINGS = list(Easing)
+
+_DESIGNANT_RE = re.compile(rb'arc\([^)]*designant[^)]*\)')
+
+
+class LoadedChart(NamedTuple):
+    chart: Chart
+    content_hash: str
+    has_designant: bool  # 谱面是否包含蚂蚁异象(designant)特有的arc，与解析选项无关
+    delay: float | None  # 以最早需要触控的音符时间作为延迟（秒），没有音符时为 None
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cache_path(data_hash: str) -> str:
+    return os.path.join(CACHE_DIR, f'{data_hash}.p{PARSER_VERSION}.affc')
+
+
+class ChartFile(NamedTuple):
+    data: bytes
+    content_hash: str
+    has_designant: bool  # 谱面是否包含蚂蚁异象(designant)特有的arc，与解析选项无关
+
+
+def read_chart_file(path: str) -> ChartFile:
+    """读取谱面文件并计算哈希和 designant 标记，不做解析"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return ChartFile(data, content_hash(data), _DESIGNANT_RE.search(data) is not None)
+
+
+def start_delay(chart: Chart) -> float | None:
+    """以最早需要触控的音符时间作为延迟（秒），没有音符时为 None"""
+    earliest = chart.time_index.earliest_tick()
+    return None if earliest is None else -earliest / 1000
+
+
+def load_chart_file(
+    path: str, resolve_parse_options: Callable[[bool], ParseOptions], chart_file: ChartFile | None = None
+) -> LoadedChart:
+    """只读取一次谱面文件，同时得到 Chart（含 scenecontrol）、designant 标记和起始延迟
+    :param path: 谱面文件路径
+    :param resolve_parse_options: 以谱面是否包含 designant arc 为参数，返回解析选项，在解析前调用一次
+    :param chart_file: 已经用 read_chart_file 读过 path 时传入，不再重复读取
+    """
+    if chart_file is None:
+        chart_file = read_chart_file(path)
+    chart = load_chart(chart_file.data, resolve_parse_options(chart_file.has_designant), chart_file.content_hash)
+    return LoadedChart(chart, chart_file.content_hash, chart_file.has_designant, start_delay(chart))
+
+
+def load_chart(data: bytes, parse_options: ParseOptions | None = None, data_hash: str | None = None) -> Chart:
+    """从谱面文件内容得到 Chart，优先使用缓存
+    缓存中保留了全部 designant arc，parse_options 在读取时才生效，因此同一谱面只需一份缓存。
+    :param data: 谱面文件的原始内容
+    :param parse_options: 解析选项，默认为 ParseOptions()
+    :param data_hash: data 的 content_hash，已经算过时传入以免重复计算
+    """
+    if parse_options is None:
+        parse_options = ParseOptions()
+    path = cache_path(data_hash or content_hash(data))
+    if os.path.exists(path):
+        try:
+            return read_cache(path, parse_options)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Chart cache {path} is invalid, re-parsing: {e}")
+
+    chart = Chart.loads(data.decode('utf-8'), ParseOptions(designant=True))
+    try:
+        write_cache(chart, path)
+    except OSError as e:
+        print(f"Failed to write chart cache {path}: {e}")
+    if not parse_options.designant:
+        chart.notes = _without_designant(chart.notes)
+    return chart
+
+
+def write_cache(chart: Chart, path: str):
+    groups = []
+    records = bytearray()
+    count = 0
+
+    def pack(*fields):
+        nonlocal count
+        records.extend(_RECORD.pack(*fields))
+        count += 1
+
+    def pack_notes(notes):
+        for note in notes:
+            if isinstance(note, TimingGroup):
+                pack(_KIND_GROUP_BEGIN, 0, 0, 0, 0, 0, len(groups), 0.0, 0.0, 0.0, 0.0)
+                groups.append(note.properties)
+                pack_notes(note.notes)
+                pack(_KIND_GROUP_END, 0, 0, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+            elif isinstance(note, Timing):
+                pack(_KIND_TIMING, 0, 0, note.tick, 0, 0, 0, note.bpm, note.beats_per_measure, 0.0, 0.0)
+            elif isinstance(note, Tap):
+                pack(_KIND_TAP, 0, 0, note.tick, 0, 0, 0, note.track, 0.0, 0.0, 0.0)
+            elif isinstance(note, Hold):
+                pack(_KIND_HOLD, 0, 0, note.start, note.end, 0, 0, note.track, 0.0, 0.0, 0.0)
+            elif isinstance(note, Arc):
+                if note.designant:
+                    trace = _TRACE_DESIGNANT
+                else:
+                    trace = _TRACE_TRUE if note.trace_arc else _TRACE_FALSE
+                pack(
+                    _KIND_ARC, _EASING_CODES[note.easing], trace,
+                    note.start, note.end, note.color, len(note.taps),
+                    note.start_x, note.end_x, note.start_y, note.end_y,
+                )
+                for tap in note.taps:
+                    pack(_KIND_ARCTAP, 0, 0, tap.tick, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+
+    pack_notes(chart.notes)
+    meta = json.dumps({
+        'options': chart.options,
+        'groups': groups,
+        'scenecontrols': [[sc.tick, sc.type, sc.args] for sc in chart.scenecontrols],
+    }).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, PARSER_VERSION, len(meta), count))
+        f.write(meta)
+        f.write(records)
+    os.replace(tmp_path, path)
+
+
+def read_cache(path: str, parse_options: ParseOptions) -> Chart:
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, format_version, parser_version, meta_size, count = _HEADER.unpack_from(mm)
+        if magic != _MAGIC or format_version != _FORMAT_VERSION or parser_version != PARSER_VERSION:
+            raise ValueError('cache version mismatch')
+        offset = _HEADER.size
+        meta = json.loads(mm[offset:offset + meta_size])
+        offset += meta_size
+        if len(mm) - offset != count * _RECORD.size:
+            raise ValueError('truncated cache file')
+        with memoryview(mm) as view, view[offset:] as records:
+            notes = _build_notes(_RECORD.iter_unpack(records), meta['groups'], parse_options)
+
+    scenecontrols = [SceneControl(tick, type_, *args) for tick, type_, args in meta['scenecontrols']]
+    return Chart(notes, meta['options'], scenecontrols)
+
+
+def _build_notes(records, groups: list[dict[str, Any]], parse_options: ParseOptions) -> list:
+    notes = []
+    stack = []
+    current_notes = notes
+    arc = None
+    for kind, easing, trace, start, end, color, aux, x1, x2, y1, y2 in records:
+        if kind == _KIND_ARCTAP:
+            if arc is not None:
+                arc.taps.append(ArcTap(start))
+            continue
+        arc = None
+        if kind == _KIND_GROUP_BEGIN:
+            group = TimingGroup(groups[aux], [])
+            current_notes.append(group)
+            stack.append(current_notes)
+            current_notes = group.notes
+        elif kind == _KIND_GROUP_END:
+            current_notes = stack.pop()
+        elif kind == _KIND_TIMING:
+            current_notes.append(Timing(start, x1, x2))
+        elif kind == _KIND_TAP:
+            current_notes.append(Tap(start, _track(x1)))
+        elif kind == _KIND_HOLD:
+            current_notes.append(Hold(start, end, _track(x1)))
+        elif kind == _KIND_ARC:
+            if trace == _TRACE_DESIGNANT:
+                if not parse_options.designant:
+                    continue
+                trace_arc = "designant"
+            else:
+                trace_arc = trace == _TRACE_TRUE
+            arc = Arc(start, end, x1, x2, _EASINGS[easing], y1, y2, color, None, trace_arc)
+            current_notes.append(arc)
+        else:
+            raise ValueError(f'unknown record kind {kind}')
+    return notes
+
+
+def _without_designant(notes: list) -> list:
+    result = []
+    for note in notes:
+        if isinstance(note, TimingGroup):
+            note.notes = _without_designant(note.notes)
+        elif isinstance(note, Arc) and note.designant:
+            continue
+        result.append(note)
+    return result
+
+
+def _track(value: float) -> int | float:
+    return int(value) if value.is_integer() else value
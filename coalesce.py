@@ -0,0 +1,94 @@
+# 播放前合并冗余的触控事件，减少控制 socket 上发送的消息
+# 只删除 MOVE，DOWN/UP 总是保留，因此每次触控的起止和指针编号都不受影响
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from algo.algo_base import TouchAction, TouchEvent
+from control_msg import TOUCH_MESSAGE
+from timeline import Timeline
+
+# control.DeviceController.touch 每个事件发送的注入触控消息长度（字节）
+TOUCH_MESSAGE_BYTES = TOUCH_MESSAGE.size
+
+_MOVE = TouchAction.MOVE.value
+_UP = TouchAction.UP.value
+
+
+def _by_pointer(timeline: Timeline) -> np.ndarray:
+    """按指针分组、组内保持时间顺序的行号"""
+    return np.lexsort((np.arange(len(timeline)), timeline.pointer))
+
+
+def _filter(timeline: Timeline, keep: np.ndarray) -> Timeline:
+    return type(timeline)(timeline.ms[keep], timeline.x[keep], timeline.y[keep], timeline.action[keep], timeline.pointer[keep])
+
+
+def coalesce(timeline: Timeline) -> Timeline:
+    """
+    合并冗余事件：
+    同一指针在同一毫秒内连续的 MOVE 只保留最后一个（包括采样时刻重复产生的 MOVE），
+    同一毫秒内紧接着在同一位置抬起的 MOVE（arc 终点的最后一个采样）也一并删除；
+    之后再删除位置与同一指针上一个事件相同的 MOVE
+    """
+    if not len(timeline):
+        return timeline
+
+    order = _by_pointer(timeline)
+    ms, x, y, action, pointer = (getattr(timeline, name)[order] for name in ('ms', 'x', 'y', 'action', 'pointer'))
+    same_touch = (action[:-1] == _MOVE) & (pointer[:-1] == pointer[1:]) & (ms[:-1] == ms[1:])
+    lifted_here = (action[1:] == _UP) & (x[:-1] == x[1:]) & (y[:-1] == y[1:])
+    superseded = np.zeros(len(order), dtype=bool)
+    superseded[:-1] = same_touch & ((action[1:] == _MOVE) | lifted_here)
+    keep = np.ones(len(timeline), dtype=bool)
+    keep[order[superseded]] = False
+    timeline = _filter(timeline, keep)
+
+    order = _by_pointer(timeline)
+    x, y, action, pointer = timeline.x[order], timeline.y[order], timeline.action[order], timeline.pointer[order]
+    unmoved = np.zeros(len(order), dtype=bool)
+    unmoved[1:] = (action[1:] == _MOVE) & (pointer[1:] == pointer[:-1]) & (x[1:] == x[:-1]) & (y[1:] == y[:-1])
+    keep = np.ones(len(timeline), dtype=bool)
+    keep[order[unmoved]] = False
+    return _filter(timeline, keep)
+
+
+def coalesce_stream(groups: Iterable[tuple[int, list[TouchEvent]]]) -> Iterator[tuple[int, list[TouchEvent]]]:
+    """coalesce 的流式版本：逐组处理 (ms, [TouchEvent, ...])，只记住每个指针上一个事件的位置，结果与之相同"""
+    last_pos = {}
+    for ms, evs in groups:
+        kept = []
+        for i, ev in enumerate(evs):
+            if ev.action == TouchAction.MOVE:
+                following = next((later for later in evs[i + 1:] if later.pointer == ev.pointer), None)
+                if following is not None and (
+                    following.action == TouchAction.MOVE
+                    or (following.action == TouchAction.UP and following.pos == ev.pos)
+                ):
+                    continue
+                if last_pos.get(ev.pointer) == ev.pos:
+                    continue
+            last_pos[ev.pointer] = ev.pos
+            kept.append(ev)
+        if kept:
+            yield ms, kept
+
+
+if __name__ == '__main__':
+    import sys
+
+    from chart import Chart
+    from pointers import allocate_pointers
+    from solve import CoordConv, solve_normalized
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chart = Chart.loads(f.read())
+    conv = CoordConv((713, 1340), (660, 660), (1868, 660), (1872, 1340))
+    for max_pixel_error in (None, 20.0):
+        timeline, _ = allocate_pointers(solve_normalized(chart, max_pixel_error=max_pixel_error))
+        timeline = timeline.project(conv)
+        merged = coalesce(timeline)
+        print(
+            f'max_pixel_error={max_pixel_error}: {len(timeline)} -> {len(merged)} events, '
+            f'{(len(timeline) - len(merged)) * TOUCH_MESSAGE_BYTES} bytes saved'
+        )
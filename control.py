@@ -1,5 +1,4 @@
 import socket
-import struct
 import subprocess
 import threading
 import time
@@ -8,7 +7,8 @@ import os
 
 import av
 
-from algo.algo_base import TouchAction
+from algo.algo_base import TouchAction, TouchEvent
+from control_msg import pack_touch
 
 
 class DeviceController:
@@ -55,6 +55,8 @@ class DeviceController:
         self.server_process = subprocess.Popen(command_line)
         self.video_socket, _ = skt.accept()
         self.control_socket, _ = skt.accept()
+        # 触控消息很小且对时刻敏感，不等待 Nagle 合并
+        self.control_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         subprocess.run(
             [*adb, 'reverse', '--remove', f'localabstract:scrcpy_{self.session_id}']
         )
@@ -106,21 +108,13 @@ class DeviceController:
         self.control_collector.start()
 
     def touch(self, x: int, y: int, action: TouchAction, pointer_id: int) -> None:
-        self.control_socket.send(
-            struct.pack(
-                '!bbQiiHHHII',
-                2,  # SC_CONTROL_MSG_TYPE_INJECT_TOUCH_EVENT
-                action.value,
-                pointer_id,
-                x,
-                y,
-                self.device_width,
-                self.device_height,
-                0xFFFF,  # pressure
-                1,  # action_button: AMOTION_EVENT_BUTTON_PRIMARY
-                1,  # buttons: AMOTION_EVENT_BUTTON_PRIMARY
-            )
-        )
+        self.control_socket.sendall(pack_touch(x, y, action, pointer_id, self.device_width, self.device_height))
+
+    def send_touches(self, events: list[TouchEvent]) -> None:
+        """把同一时刻的多个触控事件打包后一次发送"""
+        self.control_socket.sendall(b''.join(
+            pack_touch(*ev.pos, ev.action, ev.pointer, self.device_width, self.device_height) for ev in events
+        ))
 
     def tap(self, x: int, y: int, pointer_id: int = 1000, delay: float = 0.1) -> None:
         self.touch(x, y, TouchAction.DOWN, pointer_id)
@@ -0,0 +1,72 @@
+# scrcpy 控制消息的打包，不依赖视频解码，可在独立的播放进程中使用
+import struct
+
+import numpy as np
+
+from algo.algo_base import TouchAction
+
+SC_CONTROL_MSG_TYPE_INJECT_TOUCH_EVENT = 2
+
+# type, action, pointer_id, x, y, screen_width, screen_height, pressure, action_button, buttons
+TOUCH_MESSAGE = struct.Struct('!bbQiiHHHII')
+# 与 TOUCH_MESSAGE 逐字节相同的结构化 dtype，用于一次打包整条时间线
+TOUCH_MESSAGE_DTYPE = np.dtype([
+    ('type', 'i1'),
+    ('action', 'i1'),
+    ('pointer_id', '>u8'),
+    ('x', '>i4'),
+    ('y', '>i4'),
+    ('width', '>u2'),
+    ('height', '>u2'),
+    ('pressure', '>u2'),
+    ('action_button', '>u4'),
+    ('buttons', '>u4'),
+])
+
+
+def pack_touch(x: int, y: int, action: TouchAction, pointer_id: int, width: int, height: int) -> bytes:
+    return TOUCH_MESSAGE.pack(
+        SC_CONTROL_MSG_TYPE_INJECT_TOUCH_EVENT,
+        action.value,
+        pointer_id,
+        x,
+        y,
+        width,
+        height,
+        0xFFFF,  # pressure
+        1,  # action_button: AMOTION_EVENT_BUTTON_PRIMARY
+        1,  # buttons: AMOTION_EVENT_BUTTON_PRIMARY
+    )
+
+
+def pack_touches(timeline, width: int, height: int) -> bytes:
+    """把 timeline（timeline.Timeline）的全部事件按顺序打包成首尾相接的触控消息，与逐个 pack_touch 的结果相同"""
+    messages = np.zeros(len(timeline), dtype=TOUCH_MESSAGE_DTYPE)
+    messages['type'] = SC_CONTROL_MSG_TYPE_INJECT_TOUCH_EVENT
+    messages['action'] = timeline.action
+    messages['pointer_id'] = timeline.pointer
+    messages['x'] = timeline.x
+    messages['y'] = timeline.y
+    messages['width'] = width
+    messages['height'] = height
+    messages['pressure'] = 0xFFFF
+    messages['action_button'] = 1
+    messages['buttons'] = 1
+    return messages.tobytes()
+
+
+if __name__ == '__main__':
+    from timeline import TimelineBuilder
+
+    message = pack_touch(100, 200, TouchAction.DOWN, 0, 1080, 2400)
+    print(TOUCH_MESSAGE.size, message.hex())
+
+    builder = TimelineBuilder()
+    builder.add(0, TouchAction.DOWN, 0, (100, 200))
+    builder.add(5, TouchAction.MOVE, 0, (110, 220))
+    builder.add(9, TouchAction.UP, 3, (2500, 1500))
+    timeline = builder.build()
+    assert TOUCH_MESSAGE_DTYPE.itemsize == TOUCH_MESSAGE.size
+    assert pack_touches(timeline, 1080, 2400) == b''.join(
+        pack_touch(*ev.pos, ev.action, ev.pointer, 1080, 2400) for _, evs in timeline for ev in evs
+    )
@@ -1,46 +1,61 @@
 from enum import Enum
-from functools import partial
-from math import pi, sin, cos
+from functools import partial, wraps
+from math import pi
 
 import numpy as np
 
 
-def _easing_linear(
-    start: tuple[float, float, float], end: tuple[float, float, float], t: float
-) -> tuple[float, float, float]:
-    return tuple(np.array(np.mat((1 - t, t)) @ np.mat((start, end)))[0])
-
-
-def _easing_cubic_bezier(
-    start: tuple[float, float, float], end: tuple[float, float, float], t: float
-) -> tuple[float, float, float]:
-    mult = np.eye(3) * (1 - t) * (1 + 2 * t)
-    mult[1, 1] = 1.0
-    start = (np.array(start) @ mult).tolist()
-    mult = np.eye(3) * t * (3 - 2 * t)
-    mult[1, 1] = 1
-    end = (np.array(end) @ mult).tolist()
-    return _easing_linear(start, end, t)
-
-
-def _easing_sinus(
-    start: tuple[float, float, float], end: tuple[float, float, float], t: float, x: str, z: str | None = None
-) -> tuple[float, float, float]:
-    x0, y0, z0 = start
-    x1, y1, z1 = end
-    if x == 'si':
-        sx = sin(t * pi / 2)
-    elif x == 'so':
-        sx = 1 - cos(t * pi / 2)
-    else:
+def _vectorized(kernel):
+    """
+    把作用于数组的缓动核包装成缓动函数：
+    start/end 为 (x, y, z) 或形状为 (N, 3) 的数组，t 为标量或形状为 (N,) 的数组，
+    输入均为单个点时返回 (x, y, z) 元组，否则返回形状为 (N, 3) 的数组。
+    标量调用同样经过这里的数组实现，因此两种调用方式的结果逐位一致。
+    """
+    @wraps(kernel)
+    def easing(start, end, t, **kwargs):
+        start = np.asarray(start, dtype=np.float64)
+        end = np.asarray(end, dtype=np.float64)
+        t = np.asarray(t, dtype=np.float64)[..., None]
+        points = kernel(start, end, t, **kwargs)
+        if points.ndim == 1:
+            return tuple(points.tolist())
+        return points
+    return easing
+
+
+def _linear(start: np.ndarray, end: np.ndarray, t: np.ndarray) -> np.ndarray:
+    return (1 - t) * start + t * end
+
+
+# cubic bezier 只对 x 和 z 分量缓动，y 分量保持线性
+_BEZIER_AXES = np.array((True, False, True))
+
+
+def _cubic_bezier(start: np.ndarray, end: np.ndarray, t: np.ndarray) -> np.ndarray:
+    start = np.where(_BEZIER_AXES, start * ((1 - t) * (1 + 2 * t)), start)
+    end = np.where(_BEZIER_AXES, end * (t * (3 - 2 * t)), end)
+    return _linear(start, end, t)
+
+
+def _sinus_factor(t: np.ndarray, kind: str | None) -> np.ndarray:
+    if kind == 'si':
+        return np.sin(t * pi / 2)
+    if kind == 'so':
+        return 1 - np.cos(t * pi / 2)
+    return t
+
+
+def _sinus(start: np.ndarray, end: np.ndarray, t: np.ndarray, x: str, z: str | None = None) -> np.ndarray:
+    if x not in ('si', 'so'):
         raise RuntimeError(f'unknown easing type x = {x}')
-    if z == 'si':
-        sz = sin(t * pi / 2)
-    elif z == 'so':
-        sz = 1 - cos(t * pi / 2)
-    else:
-        sz = t
-    return x0 + (x1 - x0) * sx, y0 + (y1 - y0) * t, z0 + (z1 - z0) * sz
+    factor = np.concatenate(np.broadcast_arrays(_sinus_factor(t, x), t, _sinus_factor(t, z)), axis=-1)
+    return start + (end - start) * factor
+
+
+_easing_linear = _vectorized(_linear)
+_easing_cubic_bezier = _vectorized(_cubic_bezier)
+_easing_sinus = _vectorized(_sinus)
 
 
 class Easing(Enum):
@@ -53,6 +68,10 @@ class Easing(Enum):
     SoSo = partial(_easing_sinus, x='so', z='so')
     SoSi = partial(_easing_sinus, x='so', z='si')
 
+    def __reduce_ex__(self, proto):
+        # 按成员名序列化（送往求解进程池时），成员的值是 partial，无法按值还原
+        return getattr, (self.__class__, self.name)
+
 
 if __name__ == '__main__':
     print(_easing_linear((0, 1, 0), (1, 1, 0), 0.2))
@@ -60,3 +79,9 @@ if __name__ == '__main__':
     print(Easing.So.value((0, 1, 0), (1, 1, 0), 0.2))
     print(Easing.CubicBezier)
     print(Easing.SiSi)
+
+    ts = np.linspace(0, 1, 5)
+    for easing in Easing:
+        points = easing.value((0, 0, 1), (1, 1, 1), ts)
+        assert all(tuple(p) == easing.value((0, 0, 1), (1, 1, 1), t) for p, t in zip(points.tolist(), ts))
+        print(easing.name, points[:, :2].round(3).tolist())
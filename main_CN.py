@@ -2,15 +2,21 @@ import json
 import time
 import msvcrt
 import threading
-import re
+from itertools import chain
 import sys
 from pathlib import Path
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
-from chart import Chart
-from solve import solve, CoordConv
+from chart import ParseOptions
+from chart_cache import read_chart_file
+from coalesce import TOUCH_MESSAGE_BYTES
+from playback_process import PlaybackProcess
+from pointers import DEFAULT_MAX_POINTERS
+from scheduler import freeze_gc, play, play_prepared, prepare
+from solve import DEFAULT_MAX_PIXEL_ERROR
+from stream import open_stream
 from control import DeviceController
-from sixk_manager import SixKModeManager
+from timeline_cache import CALIBRATION_KEYS, load_or_solve
 
 CONFIG_FILE = "auto_arcaea_config.json"
 DEFAULT_CONFIG = {
@@ -21,6 +27,12 @@ DEFAULT_CONFIG = {
         "bottom_right": (2376, 1350),
         "chart_path": "",
         "fine_tune_step": 10,
+        "max_pixel_error": DEFAULT_MAX_PIXEL_ERROR,
+        "max_pointers": DEFAULT_MAX_POINTERS,
+        "streaming": False,
+        "playback_process": False,
+        "playback_cpu": None,
+        "playback_priority": None,
     }
 }
 
@@ -40,68 +52,6 @@ def choose_aff_file():
     root.destroy()
     return file_path
 
-def extract_delay_from_aff(input_path):
-    """遍历整个谱面，找到最早的音符时间作为延迟"""
-    with open(input_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    lines = content.split('\n')
-    earliest_time = None
-    
-    for line in lines:
-        stripped_line = line.strip()
-        
-        if stripped_line.startswith('(') and stripped_line.endswith(');'):
-            parts = stripped_line[1:-2].split(',')
-            if parts:
-                try:
-                    time_ms = int(parts[0])
-                    if earliest_time is None or time_ms < earliest_time:
-                        earliest_time = time_ms
-                except (ValueError, IndexError):
-                    pass
-        
-        elif stripped_line.startswith('hold(') and stripped_line.endswith(');'):
-            parts = stripped_line[5:-2].split(',')
-            if parts:
-                try:
-                    time_ms = int(parts[0])
-                    if earliest_time is None or time_ms < earliest_time:
-                        earliest_time = time_ms
-                except (ValueError, IndexError):
-                    pass
-        
-        elif stripped_line.startswith('arc(') and stripped_line.endswith(');'):
-            arc_content = stripped_line[4:-2]
-            parts = [p.strip() for p in arc_content.split(',')]
-            
-            if len(parts) >= 10:
-                skyline_boolean = parts[-1].lower() == 'true'
-                
-                if not skyline_boolean:
-                    try:
-                        time_ms = int(parts[0])
-                        if earliest_time is None or time_ms < earliest_time:
-                            earliest_time = time_ms
-                    except (ValueError, IndexError):
-                        pass
-        
-        elif 'arctap(' in stripped_line:
-            arctap_match = re.search(r'arctap\((\d+)\)', stripped_line)
-            if arctap_match:
-                try:
-                    time_ms = int(arctap_match.group(1))
-                    if earliest_time is None or time_ms < earliest_time:
-                        earliest_time = time_ms
-                except ValueError:
-                    pass
-    
-    if earliest_time is not None:
-        delay = -earliest_time / 1000
-        return delay
-    else:
-        return None
-
 def flush_input():
     while msvcrt.kbhit():
         msvcrt.getch()
@@ -134,19 +84,35 @@ def save_config(current_config):
     with open(CONFIG_FILE, "w") as f:
         json.dump(current_config, f, indent=2, default=lambda x: list(x) if isinstance(x, tuple) else x)
         
-def check_designant_in_chart(chart_path):
+def read_selected_chart(chart_path):
     if not chart_path or not Path(chart_path).exists():
-        return False
+        return None
     
     try:
-        with open(chart_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            import re
-            return bool(re.search(r'arc\([^)]*designant[^)]*\)', content))
-    except:
-        return False
+        return read_chart_file(chart_path)
+    except OSError:
+        return None
+
+def resolve_parse_options(current_config, has_designant_in_chart):
+    config_params = current_config["global"]
+    designant_choice = config_params.get("designant_choice")
+    
+    if designant_choice is None and has_designant_in_chart:
+        print("\n检测到谱面包含蚂蚁异象（designant）特有的note")
+        flush_input()
+        user_input = input("您是否在游玩蚂蚁异象？(y/n): ").strip().lower()
+        designant_choice = (user_input == 'y')
+        config_params["designant_choice"] = designant_choice
+        save_config(current_config)
+        
+        if designant_choice:
+            print("已启用 designant 异象模式")
+        else:
+            print("已禁用 designant 异象模式，将忽略所有特殊note")
+    
+    return ParseOptions(designant=designant_choice is not False)
 
-def show_config(current_config):
+def show_config(current_config, has_designant_in_chart):
     config_params = current_config["global"]
     chart_path = config_params.get("chart_path", "")
     
@@ -154,8 +120,6 @@ def show_config(current_config):
     print(f"谱面路径：{chart_path}")
     print(f"微调延迟：{config_params.get('fine_tune_step', 10)}毫秒")
     
-    has_designant_in_chart = check_designant_in_chart(chart_path)
-    
     if has_designant_in_chart:
         print("\n[蚂蚁异象检测]")
         print("当前谱面包含蚂蚁异象(designant)特有note")
@@ -172,7 +136,9 @@ def show_config(current_config):
 
 def quick_edit_params(current_config):
     chart_path = current_config["global"].get("chart_path", "")
-    has_designant_in_chart = check_designant_in_chart(chart_path)
+    # 读到的谱面交给 run_automation_with_6k 继续使用，不再读第二次
+    chart_file = read_selected_chart(chart_path)
+    has_designant_in_chart = chart_file is not None and chart_file.has_designant
     
     print("\n参数快捷编辑：")
     print("[1] 编辑坐标")
@@ -200,7 +166,8 @@ def quick_edit_params(current_config):
             current_config["global"]["chart_path"] = new_path
             save_config(current_config)
             print(f"谱面路径已更新为：{new_path}")
-            has_designant_in_chart = check_designant_in_chart(new_path)
+            chart_file = read_selected_chart(new_path)
+            has_designant_in_chart = chart_file is not None and chart_file.has_designant
             if has_designant_in_chart:
                 print("检测到新谱面包含蚂蚁异象(designant)特有note")
         else:
@@ -253,6 +220,8 @@ def quick_edit_params(current_config):
                 print("已禁用蚂蚁异象模式，将忽略所有蚂蚁异象note")
         
         save_config(current_config)
+    
+    return chart_file
         
 def input_coord(prompt, default):
     while True:
@@ -320,7 +289,7 @@ def start_input_listener(current_config):
     listener_thread.start()
     return listener_thread
 
-def run_automation_with_6k(current_config):
+def run_automation_with_6k(current_config, chart_file=None):
     global base_delay, time_offset, input_listener_active, automation_started
 
     chart_path = current_config["global"]["chart_path"]
@@ -331,24 +300,20 @@ def run_automation_with_6k(current_config):
         return
     
     try:
-        with open(chart_path, 'r', encoding='utf-8') as f:
-            chart_content = f.read()
-            
-        chart_content_for_regex = chart_content
-        lines = chart_content.split('\n')
-        filtered_lines = []
-        for line in lines:
-            stripped_line = line.strip()
-            if stripped_line.lower().startswith('scenecontrol'):
-                continue
-            filtered_lines.append(line)
-        chart_content_for_load = '\n'.join(filtered_lines)
-        
-        sixk_manager = SixKModeManager()
-        chart = Chart.loads(chart_content_for_load)
-        camera_intervals, lanes_intervals, max_time = sixk_manager.analyze_chart_for_6k(chart_content_for_regex, chart)
+        max_pixel_error = current_config["global"].get("max_pixel_error", DEFAULT_MAX_PIXEL_ERROR)
+        max_pointers = current_config["global"].get("max_pointers", DEFAULT_MAX_POINTERS)
+        streaming = current_config["global"].get("streaming", False)
+        # 流式求解时只解析谱面，note 在播放过程中按时间顺序逐个求解
+        solved = (open_stream if streaming else load_or_solve)(
+            chart_path,
+            [current_config["global"][key] for key in CALIBRATION_KEYS],
+            max_pixel_error,
+            lambda has_designant: resolve_parse_options(current_config, has_designant),
+            max_pointers=max_pointers,
+            chart_file=chart_file,
+        )
         
-        delay = extract_delay_from_aff(chart_path)
+        delay = solved.delay
         if delay is not None:
             base_delay = delay
             print(f"\n已调整延迟为: {delay}秒")
@@ -374,29 +339,40 @@ def run_automation_with_6k(current_config):
     print(f"  输入 - 然后回车: 延后{current_config['global'].get('fine_tune_step', 10)}毫秒") 
     print("  输入 0 然后回车: 重置微调偏移")
     print("="*40)
-    show_config(current_config)
+    show_config(current_config, solved.has_designant)
 
-    conv = CoordConv(current_config["global"]["bottom_left"], 
-                   current_config["global"]["top_left"],
-                   current_config["global"]["top_right"],
-                   current_config["global"]["bottom_right"])
+    if streaming:
+        ans_iter = solved.events
+        print("\n[流式] 边播放边求解，跳过求解结果缓存")
+    else:
+        all_events = solved.timeline
     
-    from sixk_solve import solve as solve_6k
-    from solve import solve as solve_4k
+        if not all_events:
+            print("\n[错误] 未生成任何触控事件")
+            print("可能的原因：")
+            print("1. 谱面文件为空或格式错误")
+            print("2. 坐标配置不正确")
+            print("3. 谱面中没有任何可播放的note")
+            return
     
-    all_events = sixk_manager.split_and_solve_chart(chart, conv, solve_4k, solve_6k)
+        fixed_moves = solved.stats.get('fixed_arc_moves', 0)
+        arc_moves = solved.stats.get('arc_moves', 0)
+        if solved.cached:
+            print("\n[缓存] 复用已求解的触控时间线，跳过解析与求解")
+        elif max_pixel_error is not None and fixed_moves:
+            saved = (1 - arc_moves / fixed_moves) * 100
+            print(f"\narc 采样：定步长 {fixed_moves} 个 MOVE -> 自适应 {arc_moves} 个 (误差上限 {max_pixel_error}像素，减少 {saved:.1f}%)")
     
-    if not all_events:
-        print("\n[错误] 未生成任何触控事件")
-        print("可能的原因：")
-        print("1. 谱面文件为空或格式错误")
-        print("2. 坐标配置不正确")
-        print("3. 谱面中没有任何可播放的note")
-        return
+        if solved.pointers.dropped:
+            print(f"\n[警告] 谱面最多需要同时按下 {solved.pointers.peak} 个指针，超过上限 {max_pointers}，"
+                  f"已丢弃 {len(solved.pointers.dropped)} 次触控（首次在 {solved.pointers.dropped[0]}ms）")
+        else:
+            print(f"指针：{solved.pointers.touches} 次触控，最多同时按下 {solved.pointers.peak} 个 (上限 {max_pointers})")
     
-    sorted_ans = sorted(all_events.items())
+        saved_events = solved.raw_events - len(all_events)
+        print(f"事件合并：{solved.raw_events} -> {len(all_events)} 个，控制消息减少 {saved_events * TOUCH_MESSAGE_BYTES} 字节")
     
-    ans_iter = iter(sorted_ans)
+        ans_iter = iter(all_events)
     
     try:
         ms, evs = next(ans_iter)
@@ -405,41 +381,70 @@ def run_automation_with_6k(current_config):
         return
 
     ctl = DeviceController(server_dir='.')
-    
-    input_listener_active = True
-    start_input_listener(current_config)
-    
-    designant_choice = current_config["global"].get("designant_choice")
-    
-    print("\n准备就绪，按两次回车键以开始...")
-    flush_input()
-    input()
-    
-    automation_started = True
-    
-    start_time = time.time() + base_delay
-    print('[INFO] 自动打歌启动')
-    print('[INFO] 微调功能已启用，可在下方输入命令进行微调')
-    
+
+    playback = None
+    prepared = None
+    thaw_gc = None
     try:
-        while input_listener_active:
-            with time_lock:
-                current_offset = time_offset
-                
-            now = (time.time() - start_time + current_offset) * 1000
-            
-            if now >= ms:  
-                for ev in evs:
-                    ctl.touch(*ev.pos, ev.action, ev.pointer)
-                try:
-                    ms, evs = next(ans_iter)
-                except StopIteration:
-                    break
+        if current_config["global"].get("playback_process", False):
+            if streaming:
+                print("[提示] 流式求解时无法使用独立播放进程，改为在当前进程中播放")
             else:
-                time.sleep(0.001)
-                
-    except StopIteration:
+                # 独立播放进程在等待开始前就启动，进程启动和导入的耗时不计入播放
+                playback = PlaybackProcess(
+                    all_events,
+                    ctl.control_socket,
+                    (ctl.device_width, ctl.device_height),
+                    current_config["global"].get("playback_cpu"),
+                    current_config["global"].get("playback_priority"),
+                )
+                # 等播放进程完成启动和准备后才提示开始，否则按下回车时它可能还在导入模块
+                playback.wait_ready()
+        elif not streaming:
+            # 在开始前打包好全部控制消息，播放时不再分配对象
+            prepared = prepare(all_events, (ctl.device_width, ctl.device_height))
+        
+        input_listener_active = True
+        start_input_listener(current_config)
+        
+        designant_choice = current_config["global"].get("designant_choice")
+        
+        if prepared is not None:
+            # 回收并冻结堆要十几毫秒，在确定开始时刻之前完成
+            thaw_gc = freeze_gc()
+        
+        print("\n准备就绪，按两次回车键以开始...")
+        flush_input()
+        input()
+        
+        automation_started = True
+        
+        start_ns = time.perf_counter_ns() + int(base_delay * 1e9)
+        print('[INFO] 自动打歌启动')
+        print('[INFO] 微调功能已启用，可在下方输入命令进行微调')
+        
+        # 微调偏移由输入线程整体替换，这里读取时不加锁
+        if playback is not None:
+            playback.start(start_ns)
+            lateness = playback.follow(lambda: time_offset, lambda: input_listener_active)
+        elif prepared is not None:
+            lateness = play_prepared(
+                prepared,
+                start_ns,
+                lambda: time_offset,
+                ctl.control_socket.sendall,
+                lambda: input_listener_active,
+            )
+        else:
+            lateness = play(
+                chain([(ms, evs)], ans_iter),
+                start_ns,
+                lambda: time_offset,
+                ctl.send_touches,
+                lambda: input_listener_active,
+            )
         print('[INFO] 自动打歌结束')
+        print(f'[INFO] 触控时刻滞后：{lateness.ticks} 个时刻，p50 {lateness.p50_us:.0f}微秒，p99 {lateness.p99_us:.0f}微秒，最大 {lateness.max_us:.0f}微秒')
     except (KeyboardInterrupt, SystemExit):
         print('[INFO] 用户中断执行')
     except Exception as e:
@@ -447,6 +452,14 @@ def run_automation_with_6k(current_config):
     finally:
         input_listener_active = False
         automation_started = False
+        if playback is not None:
+            playback.close()
+        if thaw_gc is not None:
+            thaw_gc()
+
+    if streaming and solved.pointers.dropped:
+        print(f"\n[警告] 谱面最多需要同时按下 {solved.pointers.peak} 个指针，超过上限 {max_pointers}，"
+              f"已丢弃 {len(solved.pointers.dropped)} 次触控（首次在 {solved.pointers.dropped[0]}ms）")
 
 def main():
     main_config = load_config()
@@ -466,9 +479,9 @@ def main():
             print("未选择文件，程序退出")
             return
 
-    quick_edit_params(main_config)
+    chart_file = quick_edit_params(main_config)
 
-    run_automation_with_6k(main_config)
+    run_automation_with_6k(main_config, chart_file)
 
     print("\n执行完毕，3秒后自动退出...")
     time.sleep(3)
@@ -0,0 +1,53 @@
+# 谱面note的时间索引
+# 遍历所有 note（包括 timinggroup 内的），预先算出最早需要触控的时间和最晚的结束时间
+from typing import Union
+
+from chart import Chart, Arc, Tap, Hold, TimingGroup
+
+Note = Union[Tap, Hold, Arc]
+
+
+def note_span(note: Note) -> tuple[int, int]:
+    if isinstance(note, Tap):
+        return note.tick, note.tick
+    return note.start, note.end
+
+
+class NoteIndex:
+    _count: int
+    _earliest: int | None
+    _latest: int
+
+    def __init__(self, chart: Chart):
+        flat = []
+
+        def collect(notes):
+            for note in notes:
+                if isinstance(note, TimingGroup):
+                    collect(note.notes)
+                elif isinstance(note, (Tap, Hold, Arc)):
+                    flat.append(note)
+
+        collect(chart.notes)
+        self._count = len(flat)
+
+        # 需要触控的时间点：tap、hold、非黑线 arc 的起点，以及所有 arctap
+        arctap_ticks = [tap.tick for note in flat if isinstance(note, Arc) for tap in note.taps]
+        touch_ticks = [
+            note_span(note)[0]
+            for note in flat
+            if not (isinstance(note, Arc) and note.trace_arc)
+        ]
+        self._earliest = min(touch_ticks + arctap_ticks, default=None)
+        self._latest = max([0, *(note_span(note)[1] for note in flat), *arctap_ticks])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def earliest_tick(self) -> int | None:
+        """最早需要触控的时间，没有任何 note 时返回 None"""
+        return self._earliest
+
+    def latest_end(self) -> int:
+        """所有 note（包括 arctap）中最晚的结束时间"""
+        return self._latest
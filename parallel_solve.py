@@ -0,0 +1,102 @@
+# 谱面的并行求解：把谱面按顶层 note（每个顶层 timinggroup 整体算作一个）切成若干块，
+# 在进程池中分别求解后 k 路归并，再统一分配指针编号。触控编号和 arc 的笔画连接在切块前按整个谱面统一规划，
+# 因此输出与整体一次求解完全相同，与工作进程数和切块方式无关
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, NamedTuple
+
+from chart import Chart
+from solve import CoordConv, REFERENCE_CONV, StrokePlan, is_stroke_arc, plan_strokes, solve_normalized, touches_used
+from timeline import ChartTimeline
+from transform import compile_notes
+
+# 需要触控的 note 少于该数量时，进程池的启动开销大于并行的收益，直接在当前进程中求解
+PARALLEL_MIN_NOTES = 2000
+# 每个工作进程平均分到的块数，多切几块可以抹平各块求解耗时的差异
+CHUNKS_PER_WORKER = 4
+
+
+class SolveJob(NamedTuple):
+    chart: Chart  # 只含本块顶层 note 的谱面
+    layout: str | Callable  # 同 solve.solve_normalized 的 layout，函数须可以 pickle
+    first_touch_id: int  # 本块第一个非笔画触控的编号
+    strokes: StrokePlan  # 本块内的笔画，下标对应本块中的 stroke arc
+
+
+def plan_jobs(chart: Chart, layout: str | Callable = '4k', chunks: int = 1) -> list[SolveJob]:
+    """把谱面按需要触控的 note 数大致均分为至多 chunks 个求解任务，切分点只落在顶层 note 之间"""
+    compiled = [list(compile_notes([note], layout)) for note in chart.notes]
+    plan = plan_strokes([note for notes in compiled for note, _ in notes if is_stroke_arc(note)])
+    target = max(1, -(-sum(len(notes) for notes in compiled) // chunks))
+
+    jobs = []
+    touch_id = plan.count
+    stroke_base = 0
+    lo = 0
+    while lo < len(compiled):
+        hi, size = lo, 0
+        while hi < len(compiled) and (size < target or hi == lo):
+            size += len(compiled[hi])
+            hi += 1
+        chunk = [item for notes in compiled[lo:hi] for item in notes]
+        stroke_end = stroke_base + sum(1 for note, _ in chunk if is_stroke_arc(note))
+        strokes = plan.window(stroke_base, stroke_end)
+        jobs.append(SolveJob(Chart(chart.notes[lo:hi], chart.options), layout, touch_id, strokes))
+        touch_id += touches_used(chunk)
+        stroke_base = stroke_end
+        lo = hi
+    return jobs
+
+
+def run_job(job: SolveJob, converter: CoordConv, max_pixel_error: float | None) -> tuple[ChartTimeline, dict]:
+    stats = {}
+    timeline = solve_normalized(
+        job.chart, converter, max_pixel_error, stats, job.layout, job.first_touch_id, job.strokes
+    )
+    return timeline, stats
+
+
+def solve_parallel(
+    chart: Chart,
+    converter: CoordConv = REFERENCE_CONV,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    layout: str | Callable = '4k',
+    workers: int | None = None,
+) -> ChartTimeline:
+    """
+    并行求解谱面坐标系下的时间线，除 workers 外参数含义同 solve.solve_normalized，
+    pointer 列同样是触控编号
+    :param workers: 工作进程数，默认为 CPU 核数；为 1 或谱面较小时在当前进程中求解
+    """
+    workers = workers or os.cpu_count() or 1
+    note_count = sum(1 for _ in compile_notes(chart.notes, layout))
+    if workers > 1 and note_count >= PARALLEL_MIN_NOTES:
+        jobs = plan_jobs(chart, layout, workers * CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(run_job, jobs, repeat(converter), repeat(max_pixel_error)))
+    else:
+        results = [run_job(job, converter, max_pixel_error) for job in plan_jobs(chart, layout)]
+
+    if stats is not None:
+        for _, job_stats in results:
+            for key, value in job_stats.items():
+                stats[key] = stats.get(key, 0) + value
+    return ChartTimeline.merge([timeline for timeline, _ in results])
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from sixk_manager import SixKModeManager
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chart = Chart.loads(f.read())
+    sixk_manager = SixKModeManager()
+    sixk_manager.analyze_chart_for_6k(chart)
+    for workers in (1, None):
+        start = time.perf_counter()
+        timeline = solve_parallel(chart, max_pixel_error=20.0, layout=sixk_manager.layout_of, workers=workers)
+        print(f'workers={workers}: {len(timeline)} events, {(time.perf_counter() - start) * 1000:.1f} ms')
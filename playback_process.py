@@ -0,0 +1,310 @@
+# 独立的播放进程：把可播放的时间线放进共享内存，由单独的进程按时刻发送触控消息（每个时刻一次 sendall），
+# 不与输入监听、视频解码、控制消息接收等线程争抢 GIL。
+# 微调偏移、开始时刻和停止信号通过另一块共享内存中的 int64 槽位传递，每个槽位只有一方写入，读写都不加锁。
+# 播放进程以 python -m playback_process 启动，只导入本模块及其依赖，不会像 multiprocessing 的 spawn 那样
+# 重新导入主进程的 __main__（main_CN/main_EN 会连带导入 av、tkinter 等）
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from control_msg import TOUCH_MESSAGE
+from scheduler import LatenessReport, freeze_gc, play_prepared, prepare
+from timeline import Timeline
+
+# 控制块中各槽位的下标
+_OFFSET_NS = 0  # 微调偏移，主进程写
+_START_NS = 1  # 第一个事件时刻 0 对应的 perf_counter_ns，0 表示尚未开始，主进程写
+_RUNNING = 2  # 主进程写 0 请求停止
+_DONE = 3  # 播放进程结束时写 1，之后的统计槽位有效
+_TICKS = 4
+_P50_NS = 5
+_P99_NS = 6
+_MAX_NS = 7
+_READY = 8  # 播放进程完成准备、可以随时开始时写 1
+_SLOTS = 9
+
+# 主进程向播放进程转发微调偏移和停止信号的间隔（秒）
+FORWARD_INTERVAL = 0.005
+# 等待播放进程完成启动和准备的上限（秒）
+READY_TIMEOUT = 30.0
+
+# 以该参数启动本模块时作为播放进程运行
+_CHILD_FLAG = '--playback-child'
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_COLUMNS = (('ms', np.int32), ('x', np.int32), ('y', np.int32), ('pointer', np.int32), ('action', np.uint8))
+
+
+def _column_views(buf, count: int) -> dict[str, np.ndarray]:
+    views = {}
+    offset = 0
+    for name, dtype in _COLUMNS:
+        views[name] = np.ndarray(count, dtype=dtype, buffer=buf, offset=offset)
+        offset += count * np.dtype(dtype).itemsize
+    return views
+
+
+def _timeline_bytes(count: int) -> int:
+    return max(1, sum(count * np.dtype(dtype).itemsize for _, dtype in _COLUMNS))
+
+
+def set_realtime(cpu: int | None, priority: int | None):
+    """把当前进程绑定到 cpu 并申请 SCHED_FIFO 实时优先级，只在 Linux 上生效，失败时打印原因后继续"""
+    if cpu is not None:
+        if hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, {cpu})
+            except OSError as e:
+                print(f'[playback] failed to pin to CPU {cpu}: {e}')
+        else:
+            print('[playback] CPU pinning is only supported on Linux')
+    if priority is not None:
+        if hasattr(os, 'sched_setscheduler'):
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            except OSError as e:
+                print(f'[playback] failed to set SCHED_FIFO priority {priority} (needs CAP_SYS_NICE): {e}')
+        else:
+            print('[playback] SCHED_FIFO is only supported on Linux')
+
+
+def _attach(name: str) -> SharedMemory:
+    """打开主进程创建的共享内存。由主进程负责释放，不让本进程的 resource_tracker 在退出时删除它"""
+    shm = SharedMemory(name)
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _dispatch(
+    timeline_name: str,
+    count: int,
+    control_name: str,
+    control_socket: socket.socket,
+    device_size: tuple[int, int],
+    cpu: int | None,
+    priority: int | None,
+    parent_pid: int,
+):
+    """播放进程的主体：完成准备后写 _READY，等待开始时刻，按时刻发送全部事件，最后把滞后统计写回控制块"""
+    set_realtime(cpu, priority)
+    timeline_shm = _attach(timeline_name)
+    control_shm = _attach(control_name)
+    control = np.ndarray(_SLOTS, dtype=np.int64, buffer=control_shm.buf)
+    try:
+        columns = _column_views(timeline_shm.buf, count)
+        timeline = Timeline(columns['ms'], columns['x'], columns['y'], columns['action'], columns['pointer'])
+        prepared = prepare(timeline, device_size)
+        # 开始时刻随时可能到来，在报告就绪之前就完成回收并冻结堆
+        thaw = freeze_gc()
+        control[_READY] = 1
+
+        while control[_START_NS] == 0 and control[_RUNNING]:
+            # 主进程意外退出时不再等待（只在 POSIX 上能察觉）
+            if os.name == 'posix' and os.getppid() != parent_pid:
+                return
+            time.sleep(0.001)
+
+        report = play_prepared(
+            prepared,
+            int(control[_START_NS]),
+            lambda: control[_OFFSET_NS] / 1e9,
+            control_socket.sendall,
+            lambda: bool(control[_RUNNING]),
+        )
+        thaw()
+        control[_TICKS] = report.ticks
+        control[_P50_NS] = int(report.p50_us * 1000)
+        control[_P99_NS] = int(report.p99_us * 1000)
+        control[_MAX_NS] = int(report.max_us * 1000)
+        del timeline, columns
+    finally:
+        control[_DONE] = 1
+        del control
+        timeline_shm.close()
+        control_shm.close()
+
+
+def _child_main(args: str):
+    """以 python -m playback_process --playback-child <参数> 启动时的入口，参数见 PlaybackProcess 的 _spawn"""
+    params = json.loads(args)
+    if params['socket_fd'] is None:
+        # Windows：主进程把 socket.share 的结果写到标准输入
+        control_socket = socket.fromshare(sys.stdin.buffer.read())
+    else:
+        control_socket = socket.socket(fileno=params['socket_fd'])
+    try:
+        _dispatch(
+            params['timeline'],
+            params['count'],
+            params['control'],
+            control_socket,
+            tuple(params['device_size']),
+            params['cpu'],
+            params['priority'],
+            params['parent_pid'],
+        )
+    finally:
+        control_socket.close()
+
+
+class PlaybackProcess:
+    """
+    在独立进程中播放 timeline（已分配指针、可直接发送的时间线）。
+    构造时即启动进程，wait_ready 等待其完成准备，调用 start 后才开始计时，
+    follow/wait 等待播放结束并返回滞后统计，close 在任何时候停止进程并释放共享内存
+    :param control_socket: scrcpy 的控制 socket，传给播放进程后两边共用，播放期间主进程不应再发送
+    :param device_size: 打包触控消息用的屏幕尺寸
+    :param cpu: 播放进程绑定的 CPU 编号
+    :param priority: 播放进程的 SCHED_FIFO 优先级 (1-99)
+    """
+
+    def __init__(
+        self,
+        timeline: Timeline,
+        control_socket: socket.socket,
+        device_size: tuple[int, int],
+        cpu: int | None = None,
+        priority: int | None = None,
+    ):
+        count = len(timeline)
+        self.timeline_shm = SharedMemory(create=True, size=_timeline_bytes(count))
+        columns = _column_views(self.timeline_shm.buf, count)
+        for name, _ in _COLUMNS:
+            columns[name][:] = getattr(timeline, name)
+        del columns
+
+        self.control_shm = SharedMemory(create=True, size=_SLOTS * 8)
+        self.control = np.ndarray(_SLOTS, dtype=np.int64, buffer=self.control_shm.buf)
+        self.control[:] = 0
+        self.control[_RUNNING] = 1
+
+        self.released = False
+        try:
+            self.process = self._spawn(count, control_socket, device_size, cpu, priority)
+        except BaseException:
+            self._release()
+            raise
+
+    def _spawn(self, count, control_socket, device_size, cpu, priority) -> subprocess.Popen:
+        params = {
+            'timeline': self.timeline_shm.name,
+            'count': count,
+            'control': self.control_shm.name,
+            'device_size': list(device_size),
+            'cpu': cpu,
+            'priority': priority,
+            'parent_pid': os.getpid(),
+            'socket_fd': None,
+        }
+        if hasattr(control_socket, 'share'):
+            # Windows 上 socket 不能靠继承传递，由 socket.share 按子进程的 pid 复制
+            command = [sys.executable, '-m', 'playback_process', _CHILD_FLAG, json.dumps(params)]
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, cwd=_MODULE_DIR)
+            process.stdin.write(control_socket.share(process.pid))
+            process.stdin.close()
+            return process
+        params['socket_fd'] = control_socket.fileno()
+        command = [sys.executable, '-m', 'playback_process', _CHILD_FLAG, json.dumps(params)]
+        return subprocess.Popen(command, pass_fds=(control_socket.fileno(),), cwd=_MODULE_DIR)
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT):
+        """等待播放进程完成启动、准备好消息并冻结堆，进程提前退出或超时时抛出 RuntimeError"""
+        deadline = time.monotonic() + timeout
+        while not self.control[_READY]:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'playback process exited with code {self.process.returncode} before it was ready')
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'playback process was not ready after {timeout:g} s')
+            time.sleep(0.001)
+
+    def set_offset(self, seconds: float):
+        self.control[_OFFSET_NS] = int(seconds * 1e9)
+
+    def start(self, start_ns: int):
+        """start_ns 为时刻 0 对应的 time.perf_counter_ns()，该时钟在同一台机器的各进程间一致"""
+        self.control[_START_NS] = start_ns
+
+    def stop(self):
+        self.control[_RUNNING] = 0
+
+    def done(self) -> bool:
+        return bool(self.control[_DONE]) or self.process.poll() is not None
+
+    def follow(self, offset: Callable[[], float], running: Callable[[], bool]) -> LatenessReport:
+        """在主进程中把微调偏移（秒）和停止信号转发给播放进程，直到播放结束，返回滞后统计"""
+        try:
+            while not self.done():
+                self.set_offset(offset())
+                if not running():
+                    self.stop()
+                time.sleep(FORWARD_INTERVAL)
+        except BaseException:
+            self.stop()
+            self.wait()
+            raise
+        return self.wait()
+
+    def wait(self) -> LatenessReport:
+        """等待播放进程退出并释放共享内存"""
+        self.process.wait()
+        control = self.control
+        report = LatenessReport(
+            int(control[_TICKS]), control[_P50_NS] / 1000, control[_P99_NS] / 1000, control[_MAX_NS] / 1000
+        )
+        del control
+        self._release()
+        return report
+
+    def close(self):
+        """停止播放进程、等待其退出并释放共享内存，已经释放过时什么也不做"""
+        if self.released:
+            return
+        self.stop()
+        self.process.wait()
+        self._release()
+
+    def _release(self):
+        self.released = True
+        del self.control
+        for shm in (self.timeline_shm, self.control_shm):
+            shm.close()
+            shm.unlink()
+
+
+if __name__ == '__main__' and sys.argv[1:2] == [_CHILD_FLAG]:
+    _child_main(sys.argv[2])
+elif __name__ == '__main__':
+    from chart import ParseOptions
+    from timeline_cache import load_or_solve
+
+    solved = load_or_solve(
+        sys.argv[1], [(713, 1340), (660, 660), (1868, 660), (1872, 1340)], 20.0, lambda has_designant: ParseOptions()
+    )
+    # 只播放前 3 秒，另一端的 socket 代替 scrcpy 服务端接收消息
+    timeline = solved.timeline
+    first = int(timeline.ms[0])
+    keep = timeline.ms < first + 3000
+    timeline = Timeline(*(getattr(timeline, name)[keep] for name in ('ms', 'x', 'y', 'action', 'pointer')))
+    sender, receiver = socket.socketpair()
+    playback = PlaybackProcess(timeline, sender, (2560, 1600), cpu=0, priority=10)
+    ready = time.perf_counter()
+    playback.wait_ready()
+    print(f'playback process ready after {(time.perf_counter() - ready) * 1000:.0f} ms')
+    playback.start(time.perf_counter_ns() + 2_000_000_000 - first * 1_000_000)
+    receiver.settimeout(4.0)
+    received = 0
+    try:
+        while received < len(timeline) * TOUCH_MESSAGE.size:
+            received += len(receiver.recv(65536))
+    except socket.timeout:
+        pass
+    print(f'{received // TOUCH_MESSAGE.size}/{len(timeline)} messages received, {playback.wait()}')
@@ -0,0 +1,138 @@
+# 指针编号分配
+# 求解器给每次触控（一次按下到抬起，连成一笔的 arc 算一次）一个独立的触控编号，
+# 这里按时间顺序把它们映射到从 0 开始的少量实际指针编号上，并限制同时按下的指针数
+import heapq
+from typing import Iterable, Iterator, NamedTuple, TypeVar
+
+import numpy as np
+
+from algo.algo_base import TouchAction, TouchEvent
+from timeline import Timeline
+
+# scrcpy 服务端同时最多跟踪 10 个指针，超出的按下事件会被直接忽略
+DEFAULT_MAX_POINTERS = 10
+
+T = TypeVar('T', bound=Timeline)
+
+
+class PointerReport(NamedTuple):
+    touches: int  # 触控次数
+    peak: int  # 谱面要求同时按下的最多指针数，不受上限影响
+    dropped: list[int]  # 因超出上限而整次丢弃的触控的按下时刻 (ms)
+
+
+class PointerPool:
+    """
+    按时间顺序逐个处理按下和抬起，给每次触控分配实际指针编号：
+    按下时从空闲编号的最小堆中取最小的一个，抬起时放回，即对触控区间做区间图着色，
+    用到的编号数等于同时按下的最多触控数。空闲编号用尽时该次触控被丢弃，记入报告
+    """
+
+    def __init__(self, max_pointers: int = DEFAULT_MAX_POINTERS):
+        self.free = list(range(max_pointers))
+        self.assigned = {}  # 按下中的触控编号 -> 指针编号，被丢弃的为 -1
+        self.peak = 0
+        self.touches = 0
+        self.dropped = []
+
+    def down(self, touch: int, ms: int) -> int:
+        """按下，返回分配到的指针编号，丢弃时为 -1"""
+        self.touches += 1
+        if self.free:
+            pointer = heapq.heappop(self.free)
+        else:
+            pointer = -1
+            self.dropped.append(ms)
+        self.assigned[touch] = pointer
+        self.peak = max(self.peak, len(self.assigned))
+        return pointer
+
+    def up(self, touch: int) -> int:
+        """抬起，返回该次触控的指针编号并将其放回空闲堆，丢弃的或未按下的触控为 -1"""
+        pointer = self.assigned.pop(touch, -1)
+        if pointer >= 0:
+            heapq.heappush(self.free, pointer)
+        return pointer
+
+    def pointer_of(self, touch: int) -> int:
+        """按下中的触控的指针编号，丢弃的或不在按下与抬起之间的触控为 -1，其事件应一并删除"""
+        return self.assigned.get(touch, -1)
+
+    def report(self) -> PointerReport:
+        return PointerReport(self.touches, self.peak, list(self.dropped))
+
+
+def allocate_pointers(timeline: T, max_pointers: int = DEFAULT_MAX_POINTERS) -> tuple[T, PointerReport]:
+    """
+    把 timeline 中的触控编号换成实际指针编号，分配方式见 PointerPool，被丢弃的触控的全部事件一并删除。
+    不在该次触控按下与抬起之间的 MOVE 也被删除，否则指针编号复用后会落到别的触控上
+    """
+    if not len(timeline):
+        return timeline, PointerReport(0, 0, [])
+
+    touch_ids = timeline.pointer
+    touch_count = int(touch_ids.max()) + 1
+    assigned = np.full(touch_count, -1, dtype=np.int32)
+    # 每次触控按下和抬起所在的行，只有这两行之间（含）的事件属于该次触控
+    down_row = np.full(touch_count, len(timeline), dtype=np.int64)
+    up_row = np.full(touch_count, len(timeline), dtype=np.int64)
+    pool = PointerPool(max_pointers)
+
+    down, up = TouchAction.DOWN.value, TouchAction.UP.value
+    edges = np.flatnonzero((timeline.action == down) | (timeline.action == up))
+    for row, ms, action, touch in zip(
+        edges.tolist(), timeline.ms[edges].tolist(), timeline.action[edges].tolist(), touch_ids[edges].tolist()
+    ):
+        if action == down:
+            assigned[touch] = pool.down(touch, ms)
+            down_row[touch] = row
+        else:
+            pool.up(touch)
+            up_row[touch] = row
+
+    pointer = assigned[touch_ids]
+    rows = np.arange(len(timeline))
+    keep = (pointer >= 0) & (rows >= down_row[touch_ids]) & (rows <= up_row[touch_ids])
+    allocated = type(timeline)(
+        timeline.ms[keep], timeline.x[keep], timeline.y[keep], timeline.action[keep], pointer[keep]
+    )
+    return allocated, pool.report()
+
+
+def allocate_stream(
+    groups: Iterable[tuple[int, list[TouchEvent]]], pool: PointerPool
+) -> Iterator[tuple[int, list[TouchEvent]]]:
+    """allocate_pointers 的流式版本：逐组换掉 (ms, [TouchEvent, ...]) 中的触控编号，结果与之相同"""
+    for ms, evs in groups:
+        allocated = []
+        for ev in evs:
+            if ev.action == TouchAction.DOWN:
+                pointer = pool.down(ev.pointer, ms)
+            elif ev.action == TouchAction.UP:
+                pointer = pool.up(ev.pointer)
+            else:
+                pointer = pool.pointer_of(ev.pointer)
+            if pointer >= 0:
+                allocated.append(ev._replace(pointer=pointer))
+        if allocated:
+            yield ms, allocated
+
+
+if __name__ == '__main__':
+    import sys
+
+    from chart import Chart
+    from sixk_manager import SixKModeManager
+    from solve import solve_normalized
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chart = Chart.loads(f.read())
+    sixk_manager = SixKModeManager()
+    sixk_manager.analyze_chart_for_6k(chart)
+    timeline = solve_normalized(chart, layout=sixk_manager.layout_of)
+    for max_pointers in (DEFAULT_MAX_POINTERS, 2):
+        allocated, report = allocate_pointers(timeline, max_pointers)
+        print(
+            f'max {max_pointers}: {report.touches} touches, peak {report.peak} pointers, '
+            f'{len(report.dropped)} dropped, ids used {sorted(set(allocated.pointer.tolist()))}'
+        )
@@ -0,0 +1,187 @@
+# 高精度播放调度：以 perf_counter_ns 计时，先粗略 sleep 到目标时刻前 SPIN_NS，再忙等到目标时刻，
+# 把同一时刻的事件一次发送，并记录每个时刻相对目标的滞后，播放结束后给出 p50/p99
+import gc
+import time
+from array import array
+from contextlib import contextmanager
+from typing import Callable, Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+from algo.algo_base import TouchEvent
+from control_msg import TOUCH_MESSAGE, pack_touches
+from timeline import Timeline
+
+# 最后一段忙等的时长，覆盖 sleep 的唤醒误差
+SPIN_NS = 500_000
+# 单次 sleep 的上限，长时间等待时也能及时读到新的微调偏移和停止信号
+MAX_SLEEP_NS = 20_000_000
+
+
+class LatenessReport(NamedTuple):
+    ticks: int  # 发送过事件的时刻数
+    p50_us: float
+    p99_us: float
+    max_us: float
+
+    def __str__(self) -> str:
+        return f'{self.ticks} ticks, lateness p50 {self.p50_us:.0f}us, p99 {self.p99_us:.0f}us, max {self.max_us:.0f}us'
+
+
+def lateness_report(lateness_ns: Sequence[int]) -> LatenessReport:
+    if not lateness_ns:
+        return LatenessReport(0, 0.0, 0.0, 0.0)
+    p50, p99 = np.percentile(np.array(lateness_ns, dtype=np.int64), (50, 99)) / 1000
+    return LatenessReport(len(lateness_ns), float(p50), float(p99), max(lateness_ns) / 1000)
+
+
+def play(
+    events: Iterable[tuple[int, list[TouchEvent]]],
+    start_ns: int,
+    offset: Callable[[], float],
+    send: Callable[[list[TouchEvent]], None],
+    running: Callable[[], bool] = lambda: True,
+    spin_ns: int = SPIN_NS,
+) -> LatenessReport:
+    """
+    按时刻发送 (ms, [TouchEvent, ...])，ms 时刻的事件在 perf_counter_ns() 到达 start_ns + ms - offset() 时一次交给 send。
+    offset 返回以秒计的微调偏移，每次等待时重新读取且不加锁：它只读取一个由输入线程整体替换的 float，
+    CPython 中这样的读取是原子的。running 返回 False 时提前结束
+    """
+    perf_counter_ns = time.perf_counter_ns
+    sleep = time.sleep
+    lateness = []
+    for ms, evs in events:
+        while True:
+            if not running():
+                return lateness_report(lateness)
+            target = start_ns + ms * 1_000_000 - int(offset() * 1e9)
+            remaining = target - perf_counter_ns()
+            if remaining <= 0:
+                break
+            if remaining > spin_ns:
+                sleep(min(remaining - spin_ns, MAX_SLEEP_NS) / 1e9)
+        lateness.append(perf_counter_ns() - target)
+        send(evs)
+    return lateness_report(lateness)
+
+
+class PreparedTimeline(NamedTuple):
+    ticks_ns: list[int]  # 每个时刻（纳秒）
+    buffer: bytes  # 全部事件的控制消息首尾相接
+    offsets: np.ndarray  # 第 i 个时刻的消息为 buffer[offsets[i]:offsets[i + 1]]
+    chunks: list[memoryview]  # 按 offsets 预先切好的每个时刻的消息
+    lateness_ns: array  # 每个时刻的滞后，播放时按顺序填入
+
+
+def prepare(timeline: Timeline, device_size: tuple[int, int]) -> PreparedTimeline:
+    """在开始播放前把全部事件打包进一块连续的缓冲并按时刻切好，同时分配好统计用的缓冲，device_size 为打包消息用的屏幕尺寸"""
+    starts = np.flatnonzero(np.diff(timeline.ms, prepend=timeline.ms[:1] - 1))
+    offsets = np.append(starts, len(timeline)) * TOUCH_MESSAGE.size
+    buffer = pack_touches(timeline, *device_size)
+    view = memoryview(buffer)
+    chunks = [view[lo:hi] for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    ticks_ns = (timeline.ms[starts].astype(np.int64) * 1_000_000).tolist()
+    return PreparedTimeline(ticks_ns, buffer, offsets, chunks, array('q', bytes(8 * len(chunks))))
+
+
+def freeze_gc() -> Callable[[], None]:
+    """
+    先回收一次并把现存对象移出 GC 跟踪（gc.freeze），然后关闭自动 GC，避免播放中途触发回收，返回恢复原状的函数。
+    回收本身要十几毫秒，应在确定开始时刻之前调用
+    """
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+
+    def thaw():
+        if enabled:
+            gc.enable()
+        gc.unfreeze()
+
+    return thaw
+
+
+@contextmanager
+def gc_quiet():
+    """在 freeze_gc 的状态下执行 with 块"""
+    thaw = freeze_gc()
+    try:
+        yield
+    finally:
+        thaw()
+
+
+def _dispatch_prepared(
+    prepared: PreparedTimeline,
+    start_ns: int,
+    offset: Callable[[], float],
+    send: Callable[[memoryview], object],
+    running: Callable[[], bool],
+    spin_ns: int,
+) -> int:
+    """play_prepared 的热循环，不创建需要保留的对象，返回已发送的时刻数"""
+    perf_counter_ns = time.perf_counter_ns
+    sleep = time.sleep
+    lateness = prepared.lateness_ns
+    sent = 0
+    for tick_ns, chunk in zip(prepared.ticks_ns, prepared.chunks):
+        while True:
+            if not running():
+                return sent
+            target = start_ns + tick_ns - int(offset() * 1e9)
+            remaining = target - perf_counter_ns()
+            if remaining <= 0:
+                break
+            if remaining > spin_ns:
+                sleep(min(remaining - spin_ns, MAX_SLEEP_NS) / 1e9)
+        lateness[sent] = perf_counter_ns() - target
+        sent += 1
+        send(chunk)
+    return sent
+
+
+def play_prepared(
+    prepared: PreparedTimeline,
+    start_ns: int,
+    offset: Callable[[], float],
+    send: Callable[[memoryview], object],
+    running: Callable[[], bool] = lambda: True,
+    spin_ns: int = SPIN_NS,
+) -> LatenessReport:
+    """
+    与 play 相同的调度，但播放 prepare 的结果：消息和统计缓冲都已事先分配，
+    每个时刻只调用一次 send(该时刻全部消息的 memoryview)，通常是 socket.sendall。
+    调用方应在确定 start_ns 之前用 freeze_gc 冻结堆并关闭 GC，播放结束后再恢复
+    """
+    sent = _dispatch_prepared(prepared, start_ns, offset, send, running, spin_ns)
+    return lateness_report(prepared.lateness_ns[:sent])
+
+
+if __name__ == '__main__':
+    from algo.algo_base import TouchAction
+
+    # 与原先以 time.time() 轮询、每次 sleep(0.001) 的播放循环对比，事件每 7ms 一组
+    events = [(ms, [TouchEvent((0, 0), TouchAction.MOVE, 0)]) for ms in range(100, 3000, 7)]
+
+    def poll_play(events, start):
+        lateness = []
+        for ms, evs in events:
+            while (time.time() - start) * 1000 < ms:
+                time.sleep(0.001)
+            lateness.extend(int(((time.time() - start) * 1000 - ms) * 1e6) for _ in evs)
+        return lateness_report(lateness)
+
+    print('poll + sleep(0.001):', poll_play(events, time.time()))
+    print('scheduler:', play(events, time.perf_counter_ns(), lambda: 0.0, lambda evs: None))
+
+    def synthetic(count: int, step_ms: int, per_tick: int = 1) -> Timeline:
+        ms = 100 + np.arange(count, dtype=np.int32) // per_tick * step_ms
+        zeros = np.zeros(count, dtype=np.int32)
+        return Timeline(ms, zeros + 100, zeros + 200, np.full(count, TouchAction.MOVE.value, dtype=np.uint8), zeros)
+
+    prepared = prepare(synthetic(len(events) * 3, 7, 3), (2560, 1600))
+    assert len(prepared.chunks) == len(events) and b''.join(prepared.chunks) == prepared.buffer
+    with gc_quiet():
+        print('prepared:', play_prepared(prepared, time.perf_counter_ns(), lambda: 0.0, len))
@@ -1,6 +1,7 @@
-import re
-from typing import List, Tuple, Dict, Optional
-from chart import TimingGroup, Arc, Tap, Hold, Chart
+from bisect import bisect_right
+from typing import List, Tuple, Union
+from chart import Arc, Tap, Hold, Chart, SceneControl
+from timeline import Timeline
 
 class SixKModeManager:
     def __init__(self):
@@ -9,30 +10,31 @@ class SixKModeManager:
         self.camera_events = []     # [(t, mt, event_type), ...] - 原始camera事件
         self.lanes_events = []      # [(t, mt, event_type), ...] - 原始lanes事件
         self.max_time = 0
+        self.sky_bounds = ([], [])      # (各段起始时间, 各段布局) - 用于Arc
+        self.ground_bounds = ([], [])   # (各段起始时间, 各段布局) - 用于地面Note
         
-    def analyze_chart_for_6k(self, chart_content: str, chart: Chart = None):
-        camera_pattern = r'scenecontrol\((\d+),enwidencamera,([\d\.]+),(\d)\);'
-        camera_matches = list(re.finditer(camera_pattern, chart_content))
-        lanes_pattern = r'scenecontrol\((\d+),enwidenlanes,([\d\.]+),(\d)\);'
-        lanes_matches = list(re.finditer(lanes_pattern, chart_content))
-        
-        self.camera_events = self._extract_events(camera_matches)
-        self.lanes_events = self._extract_events(lanes_matches)
+    def analyze_chart_for_6k(self, chart: Chart):
+        self.camera_events = self._extract_events(chart.scenecontrols, 'enwidencamera')
+        self.lanes_events = self._extract_events(chart.scenecontrols, 'enwidenlanes')
         
         self.camera_intervals = self._process_events(self.camera_events)
         self.lanes_intervals = self._process_events(self.lanes_events)
         
-        if chart:
-            self.max_time = self._get_max_time(chart)
+        self.max_time = self._get_max_time(chart)
+        
+        self.sky_bounds = self._segment_bounds(self.get_sky_segments())
+        self.ground_bounds = self._segment_bounds(self.get_ground_segments())
         
         return self.camera_intervals, self.lanes_intervals, self.max_time
     
-    def _extract_events(self, matches):
+    def _extract_events(self, scenecontrols: List[SceneControl], event_name: str):
         events = []
-        for match in matches:
-            t = int(match.group(1))
-            mt = float(match.group(2))
-            event_type = int(match.group(3))
+        for scenecontrol in scenecontrols:
+            if scenecontrol.type != event_name or len(scenecontrol.args) < 2:
+                continue
+            t = scenecontrol.tick
+            mt = float(scenecontrol.args[0])
+            event_type = int(scenecontrol.args[1])
             events.append((t, mt, event_type))
         return sorted(events, key=lambda x: x[0])
     
@@ -85,78 +87,30 @@ class SixKModeManager:
     def get_ground_segments(self) -> List[Tuple[int, int, str]]:
         return self.create_segments(self.lanes_events)
     
-    def collect_notes_by_segments(self, chart: Chart, segments: List[Tuple[int, int, str]], note_type: str = 'all') -> Dict[Tuple[int, int, str], List]:
-        segments_notes = {}
-        
-        for segment in segments:
-            start, end, mode = segment
-            notes_in_segment = []
-            
-            for note in chart.notes:
-                if hasattr(note, 'start') and hasattr(note, 'end') and hasattr(note, 'x1'):  # Arc
-                    note_time = note.start
-                    note_valid = note_type in ['arc', 'all']
-                elif hasattr(note, 'tick'):  # Tap
-                    note_time = note.tick
-                    note_valid = note_type in ['tap', 'ground', 'all']
-                elif hasattr(note, 'start') and hasattr(note, 'end'):  # Hold
-                    note_time = note.start
-                    note_valid = note_type in ['hold', 'ground', 'all']
-                else:
-                    continue
-                
-                if note_valid and start <= note_time <= end:
-                    notes_in_segment.append(note)
-            
-            segments_notes[segment] = notes_in_segment
-        
-        return segments_notes
+    def _segment_bounds(self, segments: List[Tuple[int, int, str]]) -> Tuple[List[int], List[str]]:
+        return [start for start, end, mode in segments], [mode for start, end, mode in segments]
     
-    def split_and_solve_chart(self, chart: Chart, conv, solve_4k_func, solve_6k_func):
-        all_events = {}
-        
-        sky_segments = self.get_sky_segments()
-        ground_segments = self.get_ground_segments()
-        
-        sky_notes_by_segment = self.collect_notes_by_segments(chart, sky_segments, 'arc')
-        
-        for (start, end, mode), notes in sky_notes_by_segment.items():
-            if notes:
-                segment_chart = Chart(notes, chart.options)
-                
-                if mode == '6k':
-                    segment_events = solve_6k_func(segment_chart, conv)
-                else:
-                    segment_events = solve_4k_func(segment_chart, conv)
-                
-                for time_ms, events in segment_events.items():
-                    if time_ms not in all_events:
-                        all_events[time_ms] = []
-                    all_events[time_ms].extend(events)
-        
-        ground_notes_by_segment = self.collect_notes_by_segments(chart, ground_segments, 'ground')
-        
-        for (start, end, mode), notes in ground_notes_by_segment.items():
-            if notes:
-                segment_chart = Chart(notes, chart.options)
-                
-                if mode == '6k':
-                    segment_events = solve_6k_func(segment_chart, conv)
-                else:
-                    segment_events = solve_4k_func(segment_chart, conv)
-                
-                for time_ms, events in segment_events.items():
-                    if time_ms not in all_events:
-                        all_events[time_ms] = []
-                    all_events[time_ms].extend(events)
-        
-        return all_events
+    def layout_of(self, note: Union[Arc, Tap, Hold]) -> str:
+        """
+        note 所在的布局：Arc 按 enwidencamera 分段，地面 Note 按 enwidenlanes 分段。
+        落在两段交界处的 note 归入后一段，早于第一段的 note 按 4k 处理
+        """
+        if isinstance(note, Arc):
+            starts, modes = self.sky_bounds
+            note_time = note.start
+        elif isinstance(note, Tap):
+            starts, modes = self.ground_bounds
+            note_time = note.tick
+        else:  # Hold
+            starts, modes = self.ground_bounds
+            note_time = note.start
+        
+        i = bisect_right(starts, note_time) - 1
+        return modes[i] if i >= 0 else '4k'
+    
+    def solve_chart(self, chart: Chart, conv, solve_func) -> Timeline:
+        """一次求解整个谱面（包括 timinggroup 内的 note），每个 note 的轨道布局由 layout_of 决定"""
+        return solve_func(chart, conv, layout=self.layout_of)
     
     def _get_max_time(self, chart: Chart) -> int:
-        max_time = 0
-        for note in chart.notes:
-            if hasattr(note, 'end'):
-                max_time = max(max_time, note.end)
-            elif hasattr(note, 'tick'):
-                max_time = max(max_time, note.tick)
-        return max_time
\ No newline at end of file
+        return chart.time_index.latest_end()
\ No newline at end of file
@@ -1,266 +1,35 @@
-import numpy as np
-import math
-
-from chart import Chart, Arc, Tap, Hold, TimingGroup
-from algo.algo_base import TouchAction
-
-class TouchEvent:
-    def __init__(self, position, action, pointer, alpha=1.0):
-        self.position = position 
-        self.pos = position  
-        self.action = action
-        self.pointer = pointer
-        self.alpha = alpha
-
-
-class CoordConv:
-    trans_mat: np.ndarray
-
-    def __init__(
-        self, dl: tuple[float, float], ul: tuple[float, float], ur: tuple[float, float], dr: tuple[float, float]
-    ):
-        x0, y0 = dl
-        x1, y1 = ul
-        x2, y2 = ur
-        x3, y3 = dr
-        a, b, c = x3 - x2, x1 - x2, x1 + x3 - x0 - x2
-        d, e, f = y3 - y2, y1 - y2, y1 + y3 - y0 - y2
-
-        g = b * d - a * e
-        h = (a * f - c * d) / g
-        g = (c * e - b * f) / g
-
-        c, f = x0, y0
-        a = (g + 1) * x3 - c
-        b = (h + 1) * x1 - c
-        d = (g + 1) * y3 - f
-        e = (h + 1) * y1 - f
-
-        self.trans_mat = np.array(((a, b, c), (d, e, f), (g, h, 1))).T
-
-    def __call__(self, x: float, y: float) -> tuple[float, float]:
-        x_, y_, z_ = np.array((x, y, 1)) @ self.trans_mat
-        return x_ / z_, y_ / z_
-
-
-def solve(chart: Chart, converter: CoordConv) -> dict[int, list[TouchEvent]]:
-    result = {}
-
-    def ins(ms: int, ev: TouchEvent):
-        if ms not in result:
-            result[ms] = []
-        result[ms].append(ev)
-
-    current_arctap_id = 1000  
-    arc_search_range = 5 
-
-    zero_length_arcs = {}
-
-    def process_note(note, group_properties=None):
-        nonlocal current_arctap_id, zero_length_arcs
-        group_properties = group_properties or {}
-        
-        if group_properties.get('noinput', False):
-            return
-            
-        def rotate_point(x, y, anglex, angley):
-            ax = math.radians(anglex / 10)
-            ay = math.radians(angley / 10)
-            
-            x_trans = x
-            y_trans = y
-            
-            y_rot = y_trans * math.cos(ax) - 1 * math.sin(ax)
-            z_rot = y_trans * math.sin(ax) + 1 * math.cos(ax)
-            
-            x_rot = x_trans * math.cos(ay) + z_rot * math.sin(ay)
-            
-            return x_rot, y_rot
-       
-        def correct_arc_x(x):
-            original_range = 1.63 - (-0.63)
-            target_range = 1.5 - (-0.5)
-            scale = 1.0 / 1.36 
-            offset = 0.5 - 0.5 * scale           
-            return x * scale + offset
-        
-        anglex = group_properties.get('anglex', 0)
-        angley = group_properties.get('angley', 0)
-        
-        if isinstance(note, Arc):
-            if note.start == note.end:
-                return
-            
-            corrected_start_x = correct_arc_x(note.start_x)
-            corrected_end_x = correct_arc_x(note.end_x)
-            
-            start_x, start_y = rotate_point(corrected_start_x, note.start_y, anglex, angley)
-            end_x, end_y = rotate_point(corrected_end_x, note.end_y, anglex, angley)
-            
-            start = (start_x , start_y / 1.6, 1)
-            end = (end_x , end_y / 1.6, 1)
-            delta = note.end - note.start
-            
-            if note.trace_arc:
-                for tap in note.taps:
-                    t = (tap.tick - note.start) / delta
-                    px, py, _ = note.easing.value(start, end, t)
-                    px, py = converter(px , py)
-                    ins(tap.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, current_arctap_id))
-                    ins(tap.tick + 2, TouchEvent((round(px), round(py)), TouchAction.UP, current_arctap_id))
-                    current_arctap_id += 1
-                    if current_arctap_id > 2000:
-                        current_arctap_id = 1000
-            else:
-                pointer_id = note.color + 5
-                
-                compensation_needed = False
-                compensation_x, compensation_y = 0, 0
-                
-                if note.start in zero_length_arcs:
-                    zero_arc_info = zero_length_arcs[note.start]
-                    if zero_arc_info['pointer_id'] == pointer_id:
-                        move_dx = zero_arc_info['end_x'] - zero_arc_info['start_x']
-                        move_dy = zero_arc_info['end_y'] - zero_arc_info['start_y']
-                        
-                        compensation_x = -move_dx * 0.1
-                        compensation_y = -move_dy * 0.1
-                        compensation_needed = True
-                        
-                        del zero_length_arcs[note.start]
-                
-                px, py, _ = note.easing.value(start, end, 0)
-                px, py = converter(px, py)
-                
-                ins(note.start, TouchEvent((round(px), round(py)), TouchAction.DOWN, pointer_id))
-                
-                for tck in range(note.start - arc_search_range, note.start + arc_search_range + 1):
-                    if tck not in result:
-                        continue
-                    for index, ev in enumerate(result[tck]):
-                        if ev.pointer == pointer_id and ev.action == TouchAction.UP:
-                            result[tck].pop(index)
-                            result[note.start].pop(-1)
-                            ins(note.start, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-                            break
-                    else:
-                        continue
-                    break
-
-                if compensation_needed:
-                    comp_start_x = corrected_start_x + compensation_x
-                    comp_px, comp_py = converter(comp_start_x, note.start_y + compensation_y)
-                    ins(note.start + 5, TouchEvent((round(comp_px), round(comp_py)), TouchAction.MOVE, pointer_id))
-                    ins(note.start + 10, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-
-                if note.taps:
-                    for tap in note.taps:
-                        t = (tap.tick - note.start) / delta
-                        px, py, _ = note.easing.value(start, end, t)
-                        px, py = converter(px, py)
-                        tap_pointer = current_arctap_id
-                        ins(tap.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, tap_pointer))
-                        ins(tap.tick + 10, TouchEvent((round(px), round(py)), TouchAction.UP, tap_pointer))
-                        current_arctap_id += 1
-                        if current_arctap_id > 2000:
-                            current_arctap_id = 1000
-                
-                sample_points = []
-                min_step = 10 
-                if delta > 100:
-                    steps = max(5, delta // 20)
-                    for i in range(steps + 1):
-                        sample_points.append(note.start + int(i * delta / steps))
-                else:
-                    steps = max(2, math.ceil(delta / min_step))
-                    for i in range(steps + 1):
-                        sample_points.append(note.start + int(i * delta / steps))
-                
-                for tick in sample_points:
-                    t = max(0.0, min(1.0, (tick - note.start) / delta))
-                    px, py, _ = note.easing.value(start, end, t)
-                    
-                    if anglex != 0 or angley != 0:
-                        px, py = rotate_point(px, py, anglex, angley)
-                    
-                    px, py = converter(px, py)
-                    
-                    if tick != note.start:
-                        ins(tick, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-                
-                px, py, _ = note.easing.value(start, end, 1)
-                px, py = converter(px, py)
-                ins(note.end, TouchEvent((round(px), round(py)), TouchAction.UP, pointer_id))
-                
-                for tck in range(note.end - arc_search_range, note.end + arc_search_range + 1):
-                    if tck not in result:
-                        continue
-                    for index, ev in enumerate(result[tck]):
-                        if ev.pointer == pointer_id and ev.action == TouchAction.DOWN:
-                            result[tck].pop(index)
-                            result[note.end].pop(-1)
-                            ins(tck, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-                            break
-                    else:
-                        continue
-                    break
-        
-        elif isinstance(note, Arc) and note.start == note.end:
-            if note.trace_arc:
-                return
-                
-            pointer_id = note.color + 5
-            
-            corrected_start_x = correct_arc_x(note.start_x)
-            corrected_end_x = correct_arc_x(note.end_x)
-            
-            zero_length_arcs[note.end] = {
-                'pointer_id': pointer_id,
-                'start_x': corrected_start_x,
-                'end_x': corrected_end_x,
-                'start_y': note.start_y,
-                'end_y': note.end_y
-            }
-            
-        elif isinstance(note, Tap):
-            note_x, note_y = (-0.5 + note.track * 0.5) / 1.5, 0
-            px, py = converter(note_x, note_y)
-            ins(note.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, note.track))
-            ins(note.tick + 20, TouchEvent((round(px), round(py)), TouchAction.UP, note.track))
-        
-        elif isinstance(note, Hold):
-            note_x, note_y = (-0.5 + note.track * 0.5) / 1.5, 0
-            px, py = converter(note_x, note_y)
-            hold_pointer = note.track + 100 
-            ins(note.start, TouchEvent((round(px), round(py)), TouchAction.DOWN, hold_pointer))
-            ins(note.end, TouchEvent((round(px), round(py)), TouchAction.UP, hold_pointer))
-
-    def process_timing_group(group):
-        group_properties = group.properties
-        for note in group.notes:
-            if isinstance(note, TimingGroup):
-                process_timing_group(note)
-            else:
-                process_note(note, group_properties)
-
-    for note in chart.notes:
-        if isinstance(note, TimingGroup):
-            process_timing_group(note)
-        else:
-            process_note(note)
-    
-    return result
-
-
-def distance_of(pos1, pos2):
-    return ((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2) ** 0.5
+# 6k（enwidenlanes）布局下的求解，与 4k 共用 solve.solve，只是轨道和 arc 的坐标修正不同
+from chart import Chart
+from pointers import DEFAULT_MAX_POINTERS
+from solve import CoordConv, REFERENCE_CONV, StrokePlan, distance_of, lane_x_6k
+from solve import solve as _solve
+from solve import solve_normalized as _solve_normalized
+from timeline import ChartTimeline, Timeline
+
+
+def solve(
+    chart: Chart,
+    converter: CoordConv,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    max_pointers: int = DEFAULT_MAX_POINTERS,
+) -> Timeline:
+    """参数含义同 solve.solve"""
+    return _solve(chart, converter, max_pixel_error, stats, '6k', max_pointers)
+
+
+def solve_normalized(
+    chart: Chart,
+    converter: CoordConv = REFERENCE_CONV,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    first_touch_id: int | None = None,
+    strokes: StrokePlan | None = None,
+) -> ChartTimeline:
+    """参数含义同 solve.solve_normalized"""
+    return _solve_normalized(chart, converter, max_pixel_error, stats, '6k', first_touch_id, strokes)
 
 
 if __name__ == '__main__':
     conv = CoordConv((760, 920), (650, 340), (1690, 340), (1580, 920))
-    print(conv(0, 0))
-    print(conv(0.5, 0))
-    print(conv(0.5, 0.5))
-    print(conv(1, 1))
-    print(conv(-0.5, 0))
-    print(conv(1.5, 0))
\ No newline at end of file
+    print(conv.map_many([lane_x_6k(track) for track in range(6)], [0.0] * 6))
@@ -1,16 +1,45 @@
 import numpy as np
 import math
+from functools import partial
+from typing import Callable, NamedTuple
 
-from chart import Chart, Arc, Tap, Hold, TimingGroup
+from chart import Chart, Arc, Tap, Hold
 from algo.algo_base import TouchAction
+from easing import Easing
+from pointers import DEFAULT_MAX_POINTERS, allocate_pointers
+from timeline import ChartTimeline, Timeline, TimelineBuilder
+from transform import IDENTITY, GroupTransform, compile_notes
 
-class TouchEvent:
-    def __init__(self, position, action, pointer, alpha=1.0):
-        self.position = position 
-        self.pos = position  
-        self.action = action
-        self.pointer = pointer
-        self.alpha = alpha
+# 求解器的版本号，solve/sixk_solve 的输出发生变化时递增，用于判断预编译的触控序列是否过期
+SOLVER_VERSION = 7
+
+# arc 自适应采样默认允许的最大屏幕误差（像素），在定步长采样的时刻上衡量。
+# 定步长采样自身在两个采样点之间的误差中位数约 27 像素，20 像素时 arc 的 MOVE 约减少一半
+DEFAULT_MAX_PIXEL_ERROR = 20.0
+
+# 终点与起点相距不超过该值（ms）的同色 arc 被连成一笔
+ARC_JOIN_RANGE = 5
+_JOIN_OFFSETS = sorted(range(-ARC_JOIN_RANGE, ARC_JOIN_RANGE + 1), key=abs)
+
+def lane_x_4k(track: int) -> float:
+    """4k 布局下地面轨道的横坐标，向中间收 0.1 以免按到判定区边缘"""
+    note_x = -0.75 + track * 0.5
+    return note_x - math.copysign(0.1, note_x - 0.5)
+
+
+def lane_x_6k(track: int) -> float:
+    """6k（enwidenlanes）布局下地面轨道的横坐标"""
+    return (-0.5 + track * 0.5) / 1.5
+
+
+LANE_X = {'4k': lane_x_4k, '6k': lane_x_6k}
+
+
+def project(trans_mat: np.ndarray, xs, ys) -> tuple[np.ndarray, np.ndarray]:
+    """用 (x, y, 1) @ trans_mat 批量投影，返回浮点屏幕坐标"""
+    xs = np.asarray(xs, dtype=np.float64)
+    points = np.stack((xs, np.asarray(ys, dtype=np.float64), np.ones_like(xs)), axis=-1) @ trans_mat
+    return points[..., 0] / points[..., 2], points[..., 1] / points[..., 2]
 
 
 class CoordConv:
@@ -42,206 +71,347 @@ class CoordConv:
         x_, y_, z_ = np.array((x, y, 1)) @ self.trans_mat
         return x_ / z_, y_ / z_
 
+    def project(self, xs, ys) -> tuple[np.ndarray, np.ndarray]:
+        """批量投影，返回浮点屏幕坐标"""
+        return project(self.trans_mat, xs, ys)
 
-def solve(chart: Chart, converter: CoordConv) -> dict[int, list[TouchEvent]]:
-    result = {}
+    def map_many(self, xs, ys, trans_mat: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        一次投影 N 个点，返回四舍五入后的整数屏幕坐标。
+        trans_mat 可以传入已与 homography 融合的矩阵，默认为 self.trans_mat
+        """
+        px, py = project(self.trans_mat if trans_mat is None else trans_mat, xs, ys)
+        return np.rint(px).astype(np.int64), np.rint(py).astype(np.int64)
 
-    def ins(ms: int, ev: TouchEvent):
-        if ms not in result:
-            result[ms] = []
-        result[ms].append(ev)
 
-    current_arctap_id = 1000  
-    arc_search_range = 5 
+# 与默认配置相同的校准，未给出实际校准时 arc 自适应采样的误差按该校准下的像素衡量
+REFERENCE_CONV = CoordConv((171, 1350), (171, 300), (2376, 300), (2376, 1350))
 
-    zero_length_arcs = {}
 
-    def process_note(note, group_properties=None):
-        nonlocal current_arctap_id, zero_length_arcs
-        group_properties = group_properties or {}
-        
-        if group_properties.get('noinput', False):
-            return
-            
-        def rotate_point(x, y, anglex, angley):
-            ax = math.radians(anglex / 10)
-            ay = math.radians(angley / 10)
-            
-            x_trans = x
-            y_trans = y
-            
-            y_rot = y_trans * math.cos(ax) - 1 * math.sin(ax)
-            z_rot = y_trans * math.sin(ax) + 1 * math.cos(ax)
-            
-            x_rot = x_trans * math.cos(ay) + z_rot * math.sin(ay)
-            
-            return x_rot, y_rot
-        
-        anglex = group_properties.get('anglex', 0)
-        angley = group_properties.get('angley', 0)
-        
+def fixed_sample_ticks(start: int, end: int) -> np.ndarray:
+    """定步长采样：长 arc 均分为 delta // 20 段，短 arc 约每 10ms 一段"""
+    delta = end - start
+    min_step = 10
+    if delta > 100:
+        steps = max(5, delta // 20)
+    else:
+        steps = max(2, math.ceil(delta / min_step))
+    return start + (np.arange(steps + 1) * delta / steps).astype(np.int64)
+
+
+def _step_hold_indices(screen: np.ndarray, max_error: float) -> list[int]:
+    """
+    触控点在两次 MOVE 之间停留在上一个采样点上，
+    贪心地在真实位置偏离停留点超过 max_error 像素的第一个时刻发出下一个 MOVE，
+    得到满足误差要求的最少采样点。首尾两点总是保留
+    """
+    indices = [0]
+    anchor = 0
+    while True:
+        # 从停留点往后按倍增的窗口查找第一个超出误差的点
+        lo, window = anchor + 1, 32
+        over = None
+        while lo < len(screen):
+            hi = lo + window
+            dist = np.hypot(*(screen[lo:hi] - screen[anchor]).T)
+            exceeded = np.flatnonzero(dist > max_error)
+            if len(exceeded):
+                over = lo + int(exceeded[0])
+                break
+            lo, window = hi, window * 2
+        if over is None:
+            break
+        indices.append(over)
+        anchor = over
+    if indices[-1] != len(screen) - 1:
+        indices.append(len(screen) - 1)
+    return indices
+
+
+def sample_arc(
+    easing: Easing,
+    start: tuple[float, float, float],
+    end: tuple[float, float, float],
+    tick_start: int,
+    tick_end: int,
+    projection: np.ndarray,
+    max_pixel_error: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    对 arc 采样，返回采样时刻和对应的谱面坐标 (x, y)。
+    max_pixel_error 为 None 时使用定步长采样，否则在定步长采样的点中，
+    经 projection 投影到屏幕后只保留让这些点上的误差不超过 max_pixel_error 像素所需的点，
+    因此采样点不会比定步长采样多
+    """
+    delta = tick_end - tick_start
+    ticks = fixed_sample_ticks(tick_start, tick_end)
+    t = np.clip((ticks - tick_start) / delta, 0.0, 1.0)
+    xy = easing.value(start, end, t)[:, :2]
+    if max_pixel_error is not None:
+        indices = _step_hold_indices(np.column_stack(project(projection, xy[:, 0], xy[:, 1])), max_pixel_error)
+        ticks, xy = ticks[indices], xy[indices]
+    return ticks, xy
+
+
+def link_arc_strokes(arcs: list[Arc]) -> list[int | None]:
+    """
+    按 (颜色, 起始时刻) 索引 arc，把每个 arc 与终点附近起始的同色 arc 连成一笔，
+    返回每个 arc 的后继在 arcs 中的下标，没有后继为 None。
+    候选按与终点的距离从近到远、再按谱面顺序选取，每个 arc 至多被接续一次，且后继总在时间上更靠后。
+    终点早于起点的 arc 不参与连接
+    """
+    forward = [i for i, arc in enumerate(arcs) if arc.end > arc.start]
+    by_start = {}
+    for i in forward:
+        by_start.setdefault((arcs[i].color, arcs[i].start), []).append(i)
+
+    successor = [None] * len(arcs)
+    claimed = [False] * len(arcs)
+    for i in sorted(forward, key=lambda i: (arcs[i].start, i)):
+        arc = arcs[i]
+        for offset in _JOIN_OFFSETS:
+            for j in by_start.get((arc.color, arc.end + offset), ()):
+                if not claimed[j] and (arcs[j].start, j) > (arc.start, i):
+                    successor[i] = j
+                    claimed[j] = True
+                    break
+            if successor[i] is not None:
+                break
+    return successor
+
+
+def is_stroke_arc(note) -> bool:
+    """需要手指按住滑动、参与笔画连接的 arc"""
+    return isinstance(note, Arc) and not note.trace_arc and note.start != note.end
+
+
+class StrokePlan(NamedTuple):
+    continues: set[int]  # 接续前一段的 arc，以 MOVE 开始
+    goes_on: dict[int, int]  # 后面还有接续的 arc -> 后继的起始时刻，不发出 UP，晚于该时刻的采样点交给后继
+    touch_ids: list[int]  # 每个 arc 所属笔画的触控编号，同一笔画共用一个
+    count: int  # 笔画数，笔画的触控编号为 [0, count)
+
+    def window(self, lo: int, hi: int) -> 'StrokePlan':
+        """只含下标在 [lo, hi) 中的 arc 的部分，下标从 0 重新开始"""
+        return StrokePlan(
+            {i - lo for i in self.continues if lo <= i < hi},
+            {i - lo: tick for i, tick in self.goes_on.items() if lo <= i < hi},
+            self.touch_ids[lo:hi],
+            self.count,
+        )
+
+
+def plan_strokes(arcs: list[Arc]) -> StrokePlan:
+    """把 arcs 连成笔画，StrokePlan 中的下标对应 arcs 中的位置"""
+    successor = link_arc_strokes(arcs)
+    continues = {j for j in successor if j is not None}
+    goes_on = {i: arcs[j].start for i, j in enumerate(successor) if j is not None}
+    touch_ids = [0] * len(arcs)
+    count = 0
+    for i in range(len(arcs)):
+        if i in continues:
+            continue
+        j = i
+        while j is not None:
+            touch_ids[j] = count
+            j = successor[j]
+        count += 1
+    return StrokePlan(continues, goes_on, touch_ids, count)
+
+
+def touches_used(notes) -> int:
+    """notes（compile_notes 的输出）求解时不属于笔画的触控次数：tap、hold 和 arctap 各一次"""
+    return sum(
+        len(note.taps) if isinstance(note, Arc) else 1
+        for note, _ in notes
+        if not isinstance(note, Arc) or note.start != note.end
+    )
+
+
+def solve(
+    chart: Chart,
+    converter: CoordConv,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    layout: str | Callable[[Tap | Hold | Arc], str] = '4k',
+    max_pointers: int = DEFAULT_MAX_POINTERS,
+) -> Timeline:
+    """
+    求解谱面的触控时间线
+    max_pixel_error: arc 自适应采样在定步长采样的时刻上允许的最大屏幕误差（像素），None 表示使用定步长采样
+    stats: 若给出，累加 arc 的 MOVE 数量 'arc_moves' 以及定步长采样下的数量 'fixed_arc_moves'，
+        并记录同时按下的最多指针数 'peak_pointers' 和因超出 max_pointers 而丢弃的触控数 'dropped_touches'
+    layout: 轨道布局，'4k' 或 '6k'（enwidenlanes），也可以是按 note 给出布局的函数（SixKModeManager.layout_of）
+    max_pointers: 同时按下的指针数上限，见 pointers.allocate_pointers
+    """
+    timeline, report = allocate_pointers(solve_normalized(chart, converter, max_pixel_error, stats, layout), max_pointers)
+    if stats is not None:
+        stats['peak_pointers'] = max(stats.get('peak_pointers', 0), report.peak)
+        stats['dropped_touches'] = stats.get('dropped_touches', 0) + len(report.dropped)
+    return timeline.project(converter)
+
+
+def solve_normalized(
+    chart: Chart,
+    converter: CoordConv = REFERENCE_CONV,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    layout: str | Callable[[Tap | Hold | Arc], str] = '4k',
+    first_touch_id: int | None = None,
+    strokes: StrokePlan | None = None,
+) -> ChartTimeline:
+    """
+    求解谱面坐标系下的触控时间线，之后可用任意校准通过 ChartTimeline.project 一次投影到屏幕。
+    时间线的 pointer 列是触控编号，每次触控各不相同，需经 pointers.allocate_pointers 换成实际指针编号。
+    converter 只用于衡量 arc 自适应采样的屏幕误差，其余参数含义同 solve。
+    把一个谱面切成几块分别求解时，用 first_touch_id（本块第一个非笔画触控的编号）和 strokes
+    （plan_strokes 对整个谱面的结果经 window 换算到本块）使各块的输出与整体求解一致
+    """
+    notes = list(compile_notes(chart.notes, layout))
+    builder = TimelineBuilder(8 * len(notes), np.float64)
+    note_solver = NoteSolver(notes, converter, max_pixel_error, stats, first_touch_id, strokes)
+    for note, transform in notes:
+        note_solver.solve_note(builder, note, transform)
+    note_solver.place(builder)
+    return builder.build(ChartTimeline)
+
+
+class NoteSolver:
+    """
+    逐个 note 求解触控事件并追加到 TimelineBuilder 中，参数含义同 solve_normalized。
+    arc 上的点先记下谱面坐标，调用 place 时再按所属组的旋转分批一次性放到最终位置
+    """
+
+    def __init__(
+        self,
+        notes: list,
+        converter: CoordConv,
+        max_pixel_error: float | None,
+        stats: dict | None,
+        first_touch_id: int | None = None,
+        strokes: StrokePlan | None = None,
+    ):
+        self.converter = converter
+        self.max_pixel_error = max_pixel_error
+        self.stats = stats
+        self.pending = {}  # id(旋转矩阵) -> (旋转矩阵, 行号, x, y)
+        self.error_projections = {}  # id(旋转矩阵) -> 与 homography 融合后用于衡量采样误差的矩阵
+
+        # 先把首尾相接的同色 arc 连成笔画：接续前一段的 arc 以 MOVE 开始，后面还有接续的 arc 不发出 UP
+        stroke_arcs = [note for note, _ in notes if is_stroke_arc(note)]
+        if strokes is None:
+            strokes = plan_strokes(stroke_arcs)
+        self.continues_stroke = {id(stroke_arcs[i]) for i in strokes.continues}
+        self.stroke_goes_on = {id(stroke_arcs[i]): tick for i, tick in strokes.goes_on.items()}
+        self.stroke_touch = {id(arc): touch_id for arc, touch_id in zip(stroke_arcs, strokes.touch_ids)}
+
+        # 笔画之外的触控从笔画编号之后依次编号
+        self.next_touch_id = strokes.count if first_touch_id is None else first_touch_id
+
+    def new_touch(self) -> int:
+        self.next_touch_id += 1
+        return self.next_touch_id - 1
+
+    def _pending_for(self, placement: np.ndarray) -> tuple:
+        return self.pending.setdefault(id(placement), (placement, [], [], []))
+
+    def _error_projection(self, placement: np.ndarray) -> np.ndarray:
+        if id(placement) not in self.error_projections:
+            fused = self.converter.trans_mat if placement is IDENTITY else placement @ self.converter.trans_mat
+            self.error_projections[id(placement)] = fused
+        return self.error_projections[id(placement)]
+
+    def _emit(self, builder: TimelineBuilder, ms: int, x: float, y: float, action: TouchAction, pointer: int):
+        _, rows, xs, ys = self._pending_for(IDENTITY)
+        rows.append(builder.add(ms, action, pointer))
+        xs.append(x)
+        ys.append(y)
+
+    def solve_note(self, builder: TimelineBuilder, note, transform: GroupTransform):
+        emit = partial(self._emit, builder)
+        stats = self.stats
+
         if isinstance(note, Arc):
             if note.start == note.end:
                 return
                 
-            start_x, start_y = rotate_point(note.start_x, note.start_y, anglex, angley)
-            end_x, end_y = rotate_point(note.end_x, note.end_y, anglex, angley)
-            
-            start = (start_x, start_y, 1)
-            end = (end_x, end_y, 1)
+            start, end = np.array(((note.start_x, note.start_y, 1.0), (note.end_x, note.end_y, 1.0))) @ transform.control
             delta = note.end - note.start
             
+            tap_t = np.array([tap.tick - note.start for tap in note.taps], dtype=np.float64) / delta
+            
             if note.trace_arc:
-                for tap in note.taps:
-                    t = (tap.tick - note.start) / delta
-                    px, py, _ = note.easing.value(start, end, t)
-                    px, py = converter(px, py)
-                    ins(tap.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, current_arctap_id))
-                    ins(tap.tick + 2, TouchEvent((round(px), round(py)), TouchAction.UP, current_arctap_id))
-                    current_arctap_id += 1
-                    if current_arctap_id > 2000:
-                        current_arctap_id = 1000
+                if not note.taps:
+                    return
+                for tap, (px, py, _) in zip(note.taps, note.easing.value(start, end, tap_t)):
+                    tap_pointer = self.new_touch()
+                    emit(tap.tick, px, py, TouchAction.DOWN, tap_pointer)
+                    emit(tap.tick + 2, px, py, TouchAction.UP, tap_pointer)
             else:
-                pointer_id = note.color + 5
-                
-                compensation_needed = False
-                compensation_x, compensation_y = 0, 0
-                
-                if note.start in zero_length_arcs:
-                    zero_arc_info = zero_length_arcs[note.start]
-                    if zero_arc_info['pointer_id'] == pointer_id:
-                        move_dx = zero_arc_info['end_x'] - zero_arc_info['start_x']
-                        move_dy = zero_arc_info['end_y'] - zero_arc_info['start_y']
-                        
-                        compensation_x = -move_dx * 0.1
-                        compensation_y = -move_dy * 0.1
-                        compensation_needed = True
-                        
-                        del zero_length_arcs[note.start]
-                
-                px, py, _ = note.easing.value(start, end, 0)
-                px, py = converter(px, py)
+                pointer_id = self.stroke_touch[id(note)]
                 
-                ins(note.start, TouchEvent((round(px), round(py)), TouchAction.DOWN, pointer_id))
+                # 起点、终点和 arctap 在一次缓动调用中求值
+                points = note.easing.value(start, end, np.concatenate(((0.0, 1.0), tap_t)))
+                tap_points = points[2:]
+                # 终点早于起点的 arc 按时间顺序从终点滑回起点
+                if delta > 0:
+                    first, last, first_point, last_point = note.start, note.end, points[0], points[1]
+                else:
+                    first, last, first_point, last_point = note.end, note.start, points[1], points[0]
                 
-                for tck in range(note.start - arc_search_range, note.start + arc_search_range + 1):
-                    if tck not in result:
-                        continue
-                    for index, ev in enumerate(result[tck]):
-                        if ev.pointer == pointer_id and ev.action == TouchAction.UP:
-                            result[tck].pop(index)
-                            result[note.start].pop(-1)
-                            ins(note.start, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-                            break
-                    else:
-                        continue
-                    break
-
-                if compensation_needed:
-                    comp_px, comp_py = converter(note.start_x + compensation_x, note.start_y + compensation_y)
-                    ins(note.start + 5, TouchEvent((round(comp_px), round(comp_py)), TouchAction.MOVE, pointer_id))
-                    ins(note.start + 10, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
+                px, py, _ = first_point
+                action = TouchAction.MOVE if id(note) in self.continues_stroke else TouchAction.DOWN
+                emit(first, px, py, action, pointer_id)
 
                 if note.taps:
-                    for tap in note.taps:
-                        t = (tap.tick - note.start) / delta
-                        px, py, _ = note.easing.value(start, end, t)
-                        px, py = converter(px, py)
-                        tap_pointer = current_arctap_id
-                        ins(tap.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, tap_pointer))
-                        ins(tap.tick + 10, TouchEvent((round(px), round(py)), TouchAction.UP, tap_pointer))
-                        current_arctap_id += 1
-                        if current_arctap_id > 2000:
-                            current_arctap_id = 1000
-                
-                sample_points = []
-                min_step = 10 
-                if delta > 100:
-                    steps = max(5, delta // 20)
-                    for i in range(steps + 1):
-                        sample_points.append(note.start + int(i * delta / steps))
-                else:
-                    steps = max(2, math.ceil(delta / min_step))
-                    for i in range(steps + 1):
-                        sample_points.append(note.start + int(i * delta / steps))
-                
-                for tick in sample_points:
-                    t = max(0.0, min(1.0, (tick - note.start) / delta))
-                    px, py, _ = note.easing.value(start, end, t)
-                    
-                    if anglex != 0 or angley != 0:
-                        px, py = rotate_point(px, py, anglex, angley)
-                    
-                    px, py = converter(px, py)
-                    
-                    if tick != note.start:
-                        ins(tick, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
+                    for tap, (px, py, _) in zip(note.taps, tap_points):
+                        tap_pointer = self.new_touch()
+                        emit(tap.tick, px, py, TouchAction.DOWN, tap_pointer)
+                        emit(tap.tick + 10, px, py, TouchAction.UP, tap_pointer)
                 
-                px, py, _ = note.easing.value(start, end, 1)
-                px, py = converter(px, py)
-                ins(note.end, TouchEvent((round(px), round(py)), TouchAction.UP, pointer_id))
+                sample_points, sample_xy = sample_arc(
+                    note.easing, start, end, note.start, note.end,
+                    self._error_projection(transform.placement), self.max_pixel_error,
+                )
+                # 后继可能在本段结束前就开始（甚至先结束），之后的采样点不再发出，以免在笔画抬起后仍有 MOVE
+                cut = self.stroke_goes_on.get(id(note), last)
+                moving = (sample_points != first) & (sample_points <= cut)
+                if stats is not None:
+                    fixed_points = fixed_sample_ticks(note.start, note.end)
+                    fixed_moving = (fixed_points != first) & (fixed_points <= cut)
+                    stats['fixed_arc_moves'] = stats.get('fixed_arc_moves', 0) + int(np.count_nonzero(fixed_moving))
+                    stats['arc_moves'] = stats.get('arc_moves', 0) + int(np.count_nonzero(moving))
                 
-                for tck in range(note.end - arc_search_range, note.end + arc_search_range + 1):
-                    if tck not in result:
-                        continue
-                    for index, ev in enumerate(result[tck]):
-                        if ev.pointer == pointer_id and ev.action == TouchAction.DOWN:
-                            result[tck].pop(index)
-                            result[note.end].pop(-1)
-                            ins(tck, TouchEvent((round(px), round(py)), TouchAction.MOVE, pointer_id))
-                            break
-                    else:
-                        continue
-                    break
-        
-        elif isinstance(note, Arc) and note.start == note.end:
-            if note.trace_arc:
-                return
+                _, rows, xs, ys = self._pending_for(transform.placement)
+                rows.extend(builder.add_many(sample_points[moving], TouchAction.MOVE, pointer_id).tolist())
+                xs.extend(sample_xy[moving, 0].tolist())
+                ys.extend(sample_xy[moving, 1].tolist())
                 
-            pointer_id = note.color + 5
-            
-            zero_length_arcs[note.end] = {
-                'pointer_id': pointer_id,
-                'start_x': note.start_x,
-                'end_x': note.end_x,
-                'start_y': note.start_y,
-                'end_y': note.end_y
-            }
+                if id(note) not in self.stroke_goes_on:
+                    px, py, _ = last_point
+                    emit(last, px, py, TouchAction.UP, pointer_id)
             
         elif isinstance(note, Tap):
-            note_x = -0.75 + note.track * 0.5
-            offset_direction = (note_x - 0.5) / abs(note_x - 0.5)
-            note_x -= 0.1 * offset_direction
-            note_y = 0
-            px, py = converter(note_x, note_y)
-            ins(note.tick, TouchEvent((round(px), round(py)), TouchAction.DOWN, note.track))
-            ins(note.tick + 20, TouchEvent((round(px), round(py)), TouchAction.UP, note.track))
+            pos = (LANE_X[transform.layout](note.track), 0.0)
+            tap_pointer = self.new_touch()
+            builder.add(note.tick, TouchAction.DOWN, tap_pointer, pos)
+            builder.add(note.tick + 20, TouchAction.UP, tap_pointer, pos)
 
         elif isinstance(note, Hold):
-            note_x = -0.75 + note.track * 0.5
-            offset_direction = (note_x - 0.5) / abs(note_x - 0.5)
-            note_x -= 0.1 * offset_direction
-            note_y = 0
-            px, py = converter(note_x, note_y)
-            hold_pointer = note.track + 100 
-            ins(note.start, TouchEvent((round(px), round(py)), TouchAction.DOWN, hold_pointer))
-            ins(note.end, TouchEvent((round(px), round(py)), TouchAction.UP, hold_pointer))
-            
-    def process_timing_group(group):
-        group_properties = group.properties
-        for note in group.notes:
-            if isinstance(note, TimingGroup):
-                process_timing_group(note)
-            else:
-                process_note(note, group_properties)
+            pos = (LANE_X[transform.layout](note.track), 0.0)
+            hold_pointer = self.new_touch()
+            # 终点早于起点的 hold 同样在较早的时刻按下
+            builder.add(min(note.start, note.end), TouchAction.DOWN, hold_pointer, pos)
+            builder.add(max(note.start, note.end), TouchAction.UP, hold_pointer, pos)
 
-    for note in chart.notes:
-        if isinstance(note, TimingGroup):
-            process_timing_group(note)
-        else:
-            process_note(note)
-    
-    return result
+    def place(self, builder: TimelineBuilder):
+        """把 solve_note 以来记下的点放到 builder 中"""
+        for placement, rows, xs, ys in self.pending.values():
+            if placement is not IDENTITY:
+                # 旋转矩阵的第三列为 (0, 0, 1)，齐次分量恒为 1
+                xs, ys = project(placement, xs, ys)
+            builder.set_positions(rows, xs, ys)
+        self.pending.clear()
 
 
 def distance_of(pos1, pos2):
@@ -255,4 +425,7 @@ if __name__ == '__main__':
     print(conv(0.5, 0.5))
     print(conv(1, 1))
     print(conv(-0.5, 0))
-    print(conv(1.5, 0))
\ No newline at end of file
+    print(conv(1.5, 0))
+    px, py = conv.map_many((0, 0.5, 0.5, 1, -0.5, 1.5), (0, 0, 0.5, 1, 0, 0))
+    print(list(zip(px.tolist(), py.tolist())))
+    print(conv.map_many([lane_x_4k(track) for track in range(6)], np.zeros(6)))
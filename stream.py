@@ -0,0 +1,148 @@
+# 流式求解：按时间顺序边求解边给出触控事件，播放不必等整张谱面求解完
+# 每个 note 在其最早的事件即将被取出时才求解，求解结果进入按 (时刻, note 顺序) 排序的堆中做 k 路归并，
+# 因此开始播放前只需解析谱面，内存中只保留尚未播放完的 note 的事件。
+# 输出与 timeline_cache.load_or_solve 得到的 timeline 逐事件相同，但不读写求解结果缓存
+import heapq
+from typing import Callable, Iterator, NamedTuple
+
+import numpy as np
+
+from algo.algo_base import TouchEvent
+from chart import Arc, Chart, ParseOptions, Tap
+from chart_cache import ChartFile, load_chart_file
+from coalesce import coalesce_stream
+from pointers import DEFAULT_MAX_POINTERS, PointerPool, allocate_stream
+from sixk_manager import SixKModeManager
+from solve import CoordConv, NoteSolver
+from timeline import ChartTimeline, TimelineBuilder
+from transform import compile_notes
+
+
+class ChartStream(NamedTuple):
+    events: Iterator[tuple[int, list[TouchEvent]]]  # 按时刻逐组的 (ms, [TouchEvent, ...])，只能遍历一次
+    delay: float | None
+    has_designant: bool
+    pointers: PointerPool  # 遍历过程中逐步更新，遍历完后 report() 与批量求解的报告相同
+    stats: dict  # 同 solve.solve 的 stats，同样随遍历逐步累加
+
+
+def first_tick(note) -> int:
+    """note 产生的最早事件的时刻"""
+    if isinstance(note, Tap):
+        return note.tick
+    # 终点早于起点的 hold 和 arc 从终点开始
+    if isinstance(note, Arc) and note.taps:
+        return min(note.start, note.end, min(tap.tick for tap in note.taps))
+    return min(note.start, note.end)
+
+
+def stream_events(
+    chart: Chart,
+    converter: CoordConv,
+    max_pixel_error: float | None = None,
+    stats: dict | None = None,
+    layout: str | Callable = '4k',
+) -> Iterator[tuple[int, list[TouchEvent]]]:
+    """
+    按时刻逐组给出投影到屏幕的事件，pointer 仍是触控编号，顺序与 solve_normalized 的结果投影后相同。
+    converter 同时用于投影和衡量 arc 自适应采样的误差
+    """
+    notes = list(compile_notes(chart.notes, layout))
+    note_solver = NoteSolver(notes, converter, max_pixel_error, stats)
+    starts = [first_tick(note) for note, _ in notes]
+    order = sorted(range(len(notes)), key=lambda i: (starts[i], i))
+
+    # 堆中每个已求解的 note 占一项：(下一个事件的时刻, note 序号, 行号, 事件时刻列表, 事件列表)
+    heap = []
+    pending = 0
+    while True:
+        # 最早的事件不晚于下一个未求解 note 的起点前，先求解所有可能更早发出事件的 note
+        while pending < len(order) and (not heap or starts[order[pending]] <= heap[0][0]):
+            index = order[pending]
+            pending += 1
+            note, transform = notes[index]
+            builder = TimelineBuilder(16, np.float64)
+            note_solver.solve_note(builder, note, transform)
+            note_solver.place(builder)
+            if builder.size:
+                timeline = builder.build(ChartTimeline).project(converter)
+                note_ms = timeline.ms.tolist()
+                note_events = [ev for _, evs in timeline for ev in evs]
+                heapq.heappush(heap, (note_ms[0], index, 0, note_ms, note_events))
+        if not heap:
+            return
+
+        ms = heap[0][0]
+        group = []
+        while heap and heap[0][0] == ms:
+            _, index, row, note_ms, note_events = heap[0]
+            group.append(note_events[row])
+            if row + 1 < len(note_ms):
+                heapq.heapreplace(heap, (note_ms[row + 1], index, row + 1, note_ms, note_events))
+            else:
+                heapq.heappop(heap)
+        yield ms, group
+
+
+def open_stream(
+    path: str,
+    calibration: list,
+    max_pixel_error: float | None,
+    resolve_parse_options: Callable[[bool], ParseOptions],
+    max_pointers: int = DEFAULT_MAX_POINTERS,
+    chart_file: ChartFile | None = None,
+) -> ChartStream:
+    """解析谱面并准备好可直接播放的事件流，参数含义同 timeline_cache.load_or_solve"""
+    loaded = load_chart_file(path, resolve_parse_options, chart_file)
+    sixk_manager = SixKModeManager()
+    sixk_manager.analyze_chart_for_6k(loaded.chart)
+    stats = {}
+    pool = PointerPool(max_pointers)
+    events = stream_events(loaded.chart, CoordConv(*calibration), max_pixel_error, stats, sixk_manager.layout_of)
+    return ChartStream(coalesce_stream(allocate_stream(events, pool)), loaded.delay, loaded.has_designant, pool, stats)
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+
+    from timeline_cache import load_or_solve
+
+    calibration = [(713, 1340), (660, 660), (1868, 660), (1872, 1340)]
+    options = lambda has_designant: ParseOptions()
+    tracemalloc.start()
+    start = time.perf_counter()
+    stream = open_stream(sys.argv[1], calibration, 20.0, options)
+    first = next(stream.events)
+    ready = time.perf_counter()
+    streamed = [first, *stream.events]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f'first event after {(ready - start) * 1000:.1f} ms, {len(streamed)} groups in '
+        f'{(time.perf_counter() - start) * 1000:.1f} ms, peak {peak / 1024:.0f} KiB, {stream.pointers.report()}'
+    )
+
+    start = time.perf_counter()
+    solved = load_or_solve(sys.argv[1], calibration, 20.0, options)
+    print(f'load_or_solve: {(time.perf_counter() - start) * 1000:.1f} ms, cached={solved.cached}')
+    print('same as batch:', streamed == list(solved.timeline) and stream.pointers.report() == solved.pointers)
+
+    # 在前一段结束前开始又先结束的接续 arc、紧随其后复用同一指针的 tap，以及终点早于起点的 hold 和 arc
+    edge_cases = (
+        'AudioOffset:0\n-\ntiming(0,100.00,4.00);\n'
+        'arc(1000,1500,0,1,s,1,1,0,none,false);\narc(1497,1498,1,0.5,s,1,1,0,none,false);\n(1499,1);\n'
+        'hold(2000,1900,2);\narc(3000,2800,0,1,s,1,1,0,none,false);\n'
+    )
+    with tempfile.NamedTemporaryFile('w', suffix='.aff', delete=False) as f:
+        f.write(edge_cases)
+    try:
+        stream = open_stream(f.name, calibration, None, options)
+        streamed = list(stream.events)
+        solved = load_or_solve(f.name, calibration, None, options)
+        print('edge cases same as batch:', streamed == list(solved.timeline) and stream.pointers.report() == solved.pointers)
+    finally:
+        os.remove(f.name)
@@ -0,0 +1,53 @@
+# scheduler 热循环的分配自检：python -m pytest test_scheduler.py
+import time
+import tracemalloc
+
+import numpy as np
+
+from algo.algo_base import TouchAction
+from scheduler import PreparedTimeline, SPIN_NS, _dispatch_prepared, prepare
+from timeline import Timeline
+
+DEVICE_SIZE = (2560, 1600)
+
+
+def synthetic(count: int) -> Timeline:
+    """每毫秒一个 MOVE 的时间线"""
+    ms = 100 + np.arange(count, dtype=np.int32)
+    zeros = np.zeros(count, dtype=np.int32)
+    return Timeline(ms, zeros + 100, zeros + 200, np.full(count, TouchAction.MOVE.value, dtype=np.uint8), zeros)
+
+
+def hot_loop_allocations(prepared: PreparedTimeline, warm_up: PreparedTimeline) -> tuple[int, int]:
+    """在 tracemalloc 下播放已全部到时的 prepared，返回热循环保留的字节数和瞬时峰值"""
+    start_ns = time.perf_counter_ns() - 1_000_000_000_000
+    offset, running = lambda: 0.0, lambda: True
+    tracemalloc.start()
+    try:
+        # 先在跟踪下空跑一遍，使解释器的空闲链表进入稳定状态
+        _dispatch_prepared(warm_up, start_ns, offset, len, running, SPIN_NS)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        # 只保留比较结果（bool 单例），返回的 int 在取内存数据前已释放
+        complete = _dispatch_prepared(prepared, start_ns, offset, len, running, SPIN_NS) == len(prepared.chunks)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert complete
+    return after - before, peak - before
+
+
+def test_hot_loop_retains_nothing():
+    warm_up = prepare(synthetic(100), DEVICE_SIZE)
+    retained, peak = hot_loop_allocations(prepare(synthetic(1_000), DEVICE_SIZE), warm_up)
+    assert retained == 0
+
+
+def test_hot_loop_peak_does_not_grow():
+    # 纳秒时刻等 int 超出小整数缓存，每次循环都会临时创建几个这样的对象并在本次循环内释放，
+    # 因此瞬时峰值不可能为 0（实测约 300 字节），但只取决于单次循环，与时刻数无关
+    warm_up = prepare(synthetic(100), DEVICE_SIZE)
+    _, small_peak = hot_loop_allocations(prepare(synthetic(1_000), DEVICE_SIZE), warm_up)
+    _, large_peak = hot_loop_allocations(prepare(synthetic(100_000), DEVICE_SIZE), warm_up)
+    assert large_peak == small_peak
+    assert small_peak <= 512
@@ -0,0 +1,183 @@
+# 列式触控时间线：求解器的输出
+# 每个触控事件占 time/x/y/action/pointer 五列中的一行，按时间稳定排序，同一时刻内保持事件发出的先后顺序
+# ChartTimeline 的坐标仍在谱面坐标系中，与屏幕校准无关，投影一次即得到可播放的 Timeline
+from typing import Iterator
+
+import numpy as np
+
+from algo.algo_base import TouchAction, TouchEvent
+
+_ACTIONS = {action.value: action for action in TouchAction}
+
+
+class Timeline:
+    ms: np.ndarray  # int32，非递减
+    x: np.ndarray  # int32，屏幕像素
+    y: np.ndarray
+    action: np.ndarray  # uint8，TouchAction 的值
+    pointer: np.ndarray  # int32
+
+    def __init__(self, ms: np.ndarray, x: np.ndarray, y: np.ndarray, action: np.ndarray, pointer: np.ndarray):
+        self.ms = ms
+        self.x = x
+        self.y = y
+        self.action = action
+        self.pointer = pointer
+
+    @classmethod
+    def empty(cls) -> 'Timeline':
+        return TimelineBuilder(0).build()
+
+    @classmethod
+    def concat(cls, timelines: list['Timeline']) -> 'Timeline':
+        """合并多条时间线，同一时刻的事件按 timelines 中的先后排列，结果与输入的时间线类型相同"""
+        if not timelines:
+            return cls.empty()
+        columns = [np.concatenate([getattr(t, name) for t in timelines]) for name in ('ms', 'x', 'y', 'action', 'pointer')]
+        order = np.argsort(columns[0], kind='stable')
+        return type(timelines[0])(*(column[order] for column in columns))
+
+    @classmethod
+    def merge(cls, timelines: list['Timeline']) -> 'Timeline':
+        """
+        k 路归并多条各自已按时间排序的时间线，结果与 concat 相同。
+        相邻的时间线两两归并，共 log k 轮，每轮用 searchsorted 一次算出所有事件的新位置
+        """
+        if not timelines:
+            return cls.empty()
+        timelines = list(timelines)
+        while len(timelines) > 1:
+            merged = [_merge_pair(a, b) for a, b in zip(timelines[::2], timelines[1::2])]
+            if len(timelines) % 2:
+                merged.append(timelines[-1])
+            timelines = merged
+        return timelines[0]
+
+    def __len__(self) -> int:
+        return len(self.ms)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ms.nbytes + self.x.nbytes + self.y.nbytes + self.action.nbytes + self.pointer.nbytes
+
+    def __iter__(self) -> Iterator[tuple[int, list[TouchEvent]]]:
+        """按时刻逐组给出 (ms, [TouchEvent, ...])，与原先 sorted(dict.items()) 的遍历方式兼容"""
+        bounds = np.flatnonzero(np.diff(self.ms)) + 1
+        starts = [0, *bounds.tolist()]
+        ends = [*bounds.tolist(), len(self.ms)]
+        ms, x, y = self.ms.tolist(), self.x.tolist(), self.y.tolist()
+        action, pointer = self.action.tolist(), self.pointer.tolist()
+        for lo, hi in zip(starts, ends):
+            if lo == hi:  # 空时间线
+                continue
+            yield ms[lo], [TouchEvent((x[i], y[i]), _ACTIONS[action[i]], pointer[i]) for i in range(lo, hi)]
+
+
+def _merge_pair(a: Timeline, b: Timeline) -> Timeline:
+    """稳定归并两条已排序的时间线，同一时刻 a 的事件在前"""
+    n = len(a) + len(b)
+    pos_a = np.searchsorted(b.ms, a.ms, side='left') + np.arange(len(a))
+    pos_b = np.searchsorted(a.ms, b.ms, side='right') + np.arange(len(b))
+    columns = []
+    for name in ('ms', 'x', 'y', 'action', 'pointer'):
+        column_a = getattr(a, name)
+        column = np.empty(n, dtype=column_a.dtype)
+        column[pos_a] = column_a
+        column[pos_b] = getattr(b, name)
+        columns.append(column)
+    return type(a)(*columns)
+
+
+class ChartTimeline(Timeline):
+    """x、y 为 float64 的谱面坐标（地面 y = 0，天空 y = 1），其余各列与 Timeline 相同"""
+
+    @classmethod
+    def empty(cls) -> 'ChartTimeline':
+        return TimelineBuilder(0, np.float64).build(cls)
+
+    def project(self, converter) -> Timeline:
+        """
+        用 converter（solve.CoordConv）把所有点一次投影到屏幕，得到可播放的时间线。
+        tap 和 hold 的地面轨道点也在这次投影中一并算出：按校准预先建轨道像素表再逐点查表
+        需要先找出哪些点落在轨道上，实测比直接投影还慢（约 2.4 倍），因此不建表
+        """
+        x, y = converter.map_many(self.x, self.y)
+        return Timeline(self.ms, x.astype(np.int32), y.astype(np.int32), self.action, self.pointer)
+
+
+class TimelineBuilder:
+    """
+    按发出顺序追加事件的预分配列缓冲，容量不足时倍增。
+    事件的坐标可以先留空，之后通过 set_positions 批量填入；
+    coord_dtype 为 int32 时坐标是屏幕像素，为 float64 时是谱面坐标
+    """
+
+    size: int
+
+    def __init__(self, capacity: int = 1024, coord_dtype: type = np.int32):
+        capacity = max(capacity, 16)
+        self.size = 0
+        self._ms = np.empty(capacity, dtype=np.int32)
+        self._x = np.zeros(capacity, dtype=coord_dtype)
+        self._y = np.zeros(capacity, dtype=coord_dtype)
+        self._action = np.empty(capacity, dtype=np.uint8)
+        self._pointer = np.empty(capacity, dtype=np.int32)
+
+    def _reserve(self, count: int):
+        capacity = len(self._ms)
+        if self.size + count <= capacity:
+            return
+        while capacity < self.size + count:
+            capacity *= 2
+        for name in ('_ms', '_x', '_y', '_action', '_pointer'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, ms: int, action: TouchAction, pointer: int, pos: tuple[float, float] | None = None) -> int:
+        """追加一个事件，返回其行号"""
+        self._reserve(1)
+        row = self.size
+        self._ms[row] = ms
+        self._action[row] = action.value
+        self._pointer[row] = pointer
+        if pos is not None:
+            self._x[row], self._y[row] = pos
+        self.size += 1
+        return row
+
+    def add_many(self, ms: np.ndarray, action: TouchAction, pointer: int) -> np.ndarray:
+        """追加同一指针、同一动作的一串事件，返回它们的行号"""
+        count = len(ms)
+        self._reserve(count)
+        rows = np.arange(self.size, self.size + count)
+        self._ms[rows] = ms
+        self._action[rows] = action.value
+        self._pointer[rows] = pointer
+        self.size += count
+        return rows
+
+    def set_positions(self, rows: np.ndarray, x: np.ndarray, y: np.ndarray):
+        self._x[rows] = x
+        self._y[rows] = y
+
+    def build(self, cls: type[Timeline] = Timeline) -> Timeline:
+        """裁剪到实际大小并按时间稳定排序，cls 为 ChartTimeline 时坐标列应为谱面坐标"""
+        n = self.size
+        order = np.argsort(self._ms[:n], kind='stable')
+        return cls(self._ms[:n][order], self._x[:n][order], self._y[:n][order], self._action[:n][order], self._pointer[:n][order])
+
+
+if __name__ == '__main__':
+    import sys
+
+    from chart import Chart
+    from solve import CoordConv, solve
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        chart = Chart.loads(f.read())
+    timeline = solve(chart, CoordConv((713, 1340), (660, 660), (1868, 660), (1872, 1340)))
+    print(f'events: {len(timeline)}, {timeline.nbytes / max(len(timeline), 1):.1f} bytes/event')
+    for ms, evs in list(timeline)[:5]:
+        print(ms, evs)
@@ -0,0 +1,190 @@
+# 求解结果（触控时间线）的磁盘缓存
+# 缓存的是谱面坐标系下的时间线：以谱面内容哈希、designant 选项、采样误差上限以及解析器和求解器版本作为键，
+# 定步长采样的结果与屏幕校准无关；自适应采样的误差按实际校准下的像素衡量，此时校准也是键的一部分。
+# 命中时直接读出时间线和起始延迟，完全跳过解析和求解，只需分配指针编号、按当前校准投影一次并合并冗余事件。
+# 缓存总大小超过上限时按最近使用时间淘汰
+import hashlib
+import json
+import math
+import os
+import struct
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from chart import ParseOptions, PARSER_VERSION
+from chart_cache import ChartFile, read_chart_file, load_chart, start_delay
+from coalesce import coalesce
+from parallel_solve import solve_parallel
+from pointers import DEFAULT_MAX_POINTERS, PointerReport, allocate_pointers
+from sixk_manager import SixKModeManager
+from solve import CoordConv, SOLVER_VERSION
+from timeline import ChartTimeline, Timeline
+
+TIMELINE_CACHE_DIR = ".timeline_cache"
+MAX_CACHE_BYTES = 128 * 1024 * 1024
+CALIBRATION_KEYS = ("bottom_left", "top_left", "top_right", "bottom_right")
+
+_MAGIC = b'ATLC'
+_FORMAT_VERSION = 2
+# magic, 格式版本, 事件数, 起始延迟(无音符时为 NaN), 自适应采样的 arc MOVE 数, 定步长采样下的 arc MOVE 数
+_HEADER = struct.Struct('<4sHIdII')
+_COLUMNS = (('ms', np.int32), ('x', np.float64), ('y', np.float64), ('pointer', np.int32), ('action', np.uint8))
+
+
+class SolvedChart(NamedTuple):
+    timeline: Timeline  # 按给定校准投影并合并冗余事件后的时间线
+    chart_timeline: ChartTimeline  # 谱面坐标系下、已分配指针编号的时间线，换校准时用 project 重新投影即可
+    content_hash: str
+    delay: float | None
+    stats: dict  # 'arc_moves' 和 'fixed_arc_moves'，含义同 solve.solve
+    has_designant: bool
+    cached: bool  # 是否直接取自缓存
+    pointers: PointerReport
+    raw_events: int  # 合并冗余事件之前的事件数
+
+
+def timeline_key(data_hash: str, parse_options: ParseOptions, max_pixel_error: float | None, calibration: list) -> str:
+    signature = json.dumps([
+        data_hash,
+        parse_options.designant,
+        max_pixel_error,
+        None if max_pixel_error is None else [list(point) for point in calibration],
+        PARSER_VERSION,
+        SOLVER_VERSION,
+    ])
+    return hashlib.blake2b(signature.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def cache_path(key: str) -> str:
+    return os.path.join(TIMELINE_CACHE_DIR, f'{key}.atl')
+
+
+def load_or_solve(
+    path: str,
+    calibration: list,
+    max_pixel_error: float | None,
+    resolve_parse_options: Callable[[bool], ParseOptions],
+    max_cache_bytes: int = MAX_CACHE_BYTES,
+    workers: int | None = None,
+    max_pointers: int = DEFAULT_MAX_POINTERS,
+    chart_file: ChartFile | None = None,
+) -> SolvedChart:
+    """得到谱面的触控时间线，缓存命中时不解析也不求解
+    :param path: 谱面文件路径
+    :param calibration: 按 CALIBRATION_KEYS 顺序的四个校准坐标，用于最后的投影和衡量自适应采样的误差
+    :param max_pixel_error: 传给求解器的 arc 采样误差上限，按该校准下的屏幕像素衡量
+    :param resolve_parse_options: 以谱面是否包含 designant arc 为参数，返回解析选项
+    :param max_cache_bytes: 写入新结果后缓存目录允许的总大小
+    :param workers: 求解用的工作进程数，含义同 parallel_solve.solve_parallel
+    :param max_pointers: 同时按下的指针数上限，见 pointers.allocate_pointers
+    :param chart_file: 已经用 read_chart_file 读过 path 时传入，不再重复读取
+    """
+    if chart_file is None:
+        chart_file = read_chart_file(path)
+    parse_options = resolve_parse_options(chart_file.has_designant)
+    key = timeline_key(chart_file.content_hash, parse_options, max_pixel_error, calibration)
+    conv = CoordConv(*calibration)
+
+    cached = read_timeline(key)
+    if cached is not None:
+        timeline, delay, stats = cached
+        timeline, report = allocate_pointers(timeline, max_pointers)
+        projected = timeline.project(conv)
+        return SolvedChart(
+            coalesce(projected), timeline, chart_file.content_hash, delay, stats, chart_file.has_designant, True,
+            report, len(projected),
+        )
+
+    chart = load_chart(chart_file.data, parse_options, chart_file.content_hash)
+    sixk_manager = SixKModeManager()
+    sixk_manager.analyze_chart_for_6k(chart)
+    stats = {}
+    timeline = solve_parallel(chart, conv, max_pixel_error, stats, sixk_manager.layout_of, workers)
+    delay = start_delay(chart)
+    try:
+        write_timeline(key, timeline, delay, stats)
+        evict(max_cache_bytes)
+    except OSError as e:
+        print(f"Failed to write timeline cache for {path}: {e}")
+    timeline, report = allocate_pointers(timeline, max_pointers)
+    projected = timeline.project(conv)
+    return SolvedChart(
+        coalesce(projected), timeline, chart_file.content_hash, delay, stats, chart_file.has_designant, False,
+        report, len(projected),
+    )
+
+
+def read_timeline(key: str) -> tuple[ChartTimeline, float | None, dict] | None:
+    path = cache_path(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, count, delay, arc_moves, fixed_arc_moves = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError('timeline cache version mismatch')
+        columns = {}
+        offset = _HEADER.size
+        for name, dtype in _COLUMNS:
+            columns[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += columns[name].nbytes
+        # 记录最近使用时间，供淘汰时参考
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Timeline cache {path} is invalid, re-solving: {e}")
+        return None
+    timeline = ChartTimeline(columns['ms'], columns['x'], columns['y'], columns['action'], columns['pointer'])
+    stats = {'arc_moves': arc_moves, 'fixed_arc_moves': fixed_arc_moves}
+    return timeline, None if math.isnan(delay) else delay, stats
+
+
+def write_timeline(key: str, timeline: ChartTimeline, delay: float | None, stats: dict):
+    os.makedirs(TIMELINE_CACHE_DIR, exist_ok=True)
+    path = cache_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(
+            _MAGIC, _FORMAT_VERSION, len(timeline), math.nan if delay is None else delay,
+            stats.get('arc_moves', 0), stats.get('fixed_arc_moves', 0),
+        ))
+        for name, dtype in _COLUMNS:
+            f.write(np.ascontiguousarray(getattr(timeline, name), dtype=dtype).tobytes())
+    os.replace(tmp_path, path)
+
+
+def evict(max_bytes: int = MAX_CACHE_BYTES):
+    """按最近使用时间从旧到新删除缓存文件，直到总大小不超过 max_bytes"""
+    entries = []
+    with os.scandir(TIMELINE_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith('.atl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    calibration = [(713, 1340), (660, 660), (1868, 660), (1872, 1340)]
+    for attempt in ('cold', 'warm'):
+        start = time.perf_counter()
+        solved = load_or_solve(sys.argv[1], calibration, None, lambda has_designant: ParseOptions())
+        print(f'{attempt}: {len(solved.timeline)} events, cached={solved.cached}, {(time.perf_counter() - start) * 1000:.1f} ms')
+    start = time.perf_counter()
+    timeline = solved.chart_timeline.project(CoordConv((760, 920), (650, 340), (1690, 340), (1580, 920)))
+    print(f'recalibrate: {len(timeline)} events, {(time.perf_counter() - start) * 1000:.1f} ms')
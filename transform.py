@@ -0,0 +1,83 @@
+# timinggroup 属性和轨道布局到仿射变换的编译
+# 所有矩阵均为 3x3，采用与 CoordConv.trans_mat 相同的行向量约定: (x, y, 1) @ M
+# 这里的变换都在谱面坐标系内，不涉及屏幕校准；到屏幕的投影由 CoordConv 在求解之后统一完成
+import math
+from typing import Any, Callable, Iterator, NamedTuple, Union
+
+import numpy as np
+
+from chart import Arc, Tap, Hold, TimingGroup
+
+IDENTITY = np.eye(3)
+
+# 6k 布局下天空 arc 的横向压缩（以 0.5 为中心缩放 1/1.36）和纵向压缩
+SIXK_ARC_X_SCALE = 1.0 / 1.36
+SIXK_ARC_Y_SCALE = 1.0 / 1.6
+
+
+def rotation(anglex: float, angley: float) -> np.ndarray:
+    """
+    timinggroup 的 anglex/angley（单位 0.1 度）对应的变换：
+    y' = y * cos(ax) - sin(ax)，x' = x * cos(ay) + (y * sin(ax) + cos(ax)) * sin(ay)
+    """
+    if not anglex and not angley:
+        return IDENTITY
+    ax = math.radians(anglex / 10)
+    ay = math.radians(angley / 10)
+    return np.array((
+        (math.cos(ay), 0.0, 0.0),
+        (math.sin(ax) * math.sin(ay), math.cos(ax), 0.0),
+        (math.cos(ax) * math.sin(ay), -math.sin(ax), 1.0),
+    ))
+
+
+def layout_matrices(layout: str) -> tuple[np.ndarray, np.ndarray]:
+    """布局对 arc 端点的修正，分别作用在旋转之前和之后"""
+    if layout == '4k':
+        return IDENTITY, IDENTITY
+    if layout == '6k':
+        offset = 0.5 - 0.5 * SIXK_ARC_X_SCALE
+        before = np.array(((SIXK_ARC_X_SCALE, 0.0, 0.0), (0.0, 1.0, 0.0), (offset, 0.0, 1.0)))
+        after = np.diag((1.0, SIXK_ARC_Y_SCALE, 1.0))
+        return before, after
+    raise ValueError(f'unknown layout {layout!r}')
+
+
+class GroupTransform(NamedTuple):
+    control: np.ndarray  # 缓动前作用在 arc 端点上的变换（布局修正与旋转的合成）
+    placement: np.ndarray  # arc 采样点上的再次旋转，把采样点放到最终的谱面坐标；未旋转的组为 IDENTITY 本身
+    layout: str  # 轨道布局，决定地面 note 的轨道位置
+
+
+def compile_group(properties: dict[str, Any], layout: str) -> GroupTransform | None:
+    """把一个 timinggroup 的属性编译为变换，noinput 的组返回 None"""
+    if properties.get('noinput', False):
+        return None
+    rotate = rotation(float(properties.get('anglex', 0)), float(properties.get('angley', 0)))
+    before, after = layout_matrices(layout)
+    return GroupTransform(before @ rotate @ after, rotate, layout)
+
+
+def compile_notes(
+    notes: list, layout: str | Callable[[Union[Tap, Hold, Arc]], str]
+) -> Iterator[tuple[Union[Tap, Hold, Arc], GroupTransform]]:
+    """
+    按谱面顺序展开 timinggroup，给出每个需要触控的 note 及其所属组在该 note 布局下编译后的变换。
+    layout 为 '4k'/'6k'，或按 note 给出布局的函数（如 SixKModeManager.layout_of）。
+    noinput 组中的 note 直接被丢弃；嵌套的组只使用自己的属性
+    """
+    layout_of = layout if callable(layout) else lambda note: layout
+
+    def walk(notes, properties):
+        transforms = {}  # 布局 -> 本组的变换
+        for note in notes:
+            if isinstance(note, TimingGroup):
+                # noinput 组内嵌套的组不继承 noinput
+                yield from walk(note.notes, None if note.properties.get('noinput', False) else note.properties)
+            elif properties is not None and isinstance(note, (Tap, Hold, Arc)):
+                note_layout = layout_of(note)
+                if note_layout not in transforms:
+                    transforms[note_layout] = compile_group(properties, note_layout)
+                yield note, transforms[note_layout]
+
+    yield from walk(notes, {})